@@ -1,8 +1,11 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config, pool
 
 from alembic import context
+from app.config import settings
+from app.migrations import run_with_lock_retry, set_timeouts
 from app.models.task import Base
 
 target_metadata = Base.metadata
@@ -17,6 +20,11 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# DATABASE_URL overrides the URL from alembic.ini, like it does for the app
+if "DATABASE_URL" in os.environ:
+    # ConfigParser treats "%" as interpolation syntax
+    config.set_main_option("sqlalchemy.url", settings.database_url.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -58,6 +66,13 @@ def run_migrations_online() -> None:
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
+    Every migration runs in its own transaction, so migrations can leave
+    the transaction for ``CREATE INDEX CONCURRENTLY`` and a failure only
+    rolls back the migration that failed. Lock and statement timeouts
+    (``MIGRATION_LOCK_TIMEOUT_MS``, ``MIGRATION_STATEMENT_TIMEOUT_MS``) keep
+    DDL from queueing behind long transactions and stalling traffic; a
+    migration that times out is retried from the current revision.
+
     """
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
@@ -66,10 +81,19 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
-
-        with context.begin_transaction():
-            context.run_migrations()
+        set_timeouts(connection)
+        connection.commit()
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            transaction_per_migration=True,
+        )
+
+        def run():
+            with context.begin_transaction():
+                context.run_migrations()
+
+        run_with_lock_retry(run)
 
 
 if context.is_offline_mode():
@@ -0,0 +1,39 @@
+"""create tasks table
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-01-21 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("is_completed", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_tasks_id"), "tasks", ["id"], unique=False)
+    op.create_index(op.f("ix_tasks_title"), "tasks", ["title"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_tasks_title"), table_name="tasks")
+    op.drop_index(op.f("ix_tasks_id"), table_name="tasks")
+    op.drop_table("tasks")
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response
+
+from app.dependencies import require_admin_token
+from app.diagnostics import profiles, slow_queries
+from app.schemas.diagnostics import ProfileSummary, SlowQuery
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/profiles", response_model=list[ProfileSummary])
+def list_profiles():
+    """
+    List the most recent request profiles, newest first.
+
+    Returns:
+        List[ProfileSummary]: Buffered profiles without their stats
+    """
+    return [ProfileSummary(**vars(record)) for record in profiles.items()]
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: int,
+    format: str = Query("text", pattern="^(text|pstats)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+):
+    """
+    Download a request profile.
+
+    Args:
+        profile_id (int): ID returned in the ``X-Profile-Id`` response header
+        format (str): ``text`` for a pstats report, ``pstats`` for a binary
+            file loadable with ``pstats.Stats`` or snakeviz
+        sort (str): Sort key of the text report
+
+    Raises:
+        HTTPException: 404 if the profile was never recorded or was evicted
+    """
+    record = profiles.get(profile_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile with ID {profile_id} not found",
+        )
+    if format == "pstats":
+        filename = f"profile-{profile_id}.prof"
+        return Response(
+            content=record.dump(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    return PlainTextResponse(record.render(sort=sort))
+
+
+@router.delete("/profiles", status_code=status.HTTP_204_NO_CONTENT)
+def clear_profiles():
+    """Drop all buffered profiles."""
+    profiles.clear()
+
+
+@router.get("/slow-queries", response_model=list[SlowQuery])
+def list_slow_queries():
+    """
+    List the most recent slow queries, newest first.
+
+    Returns:
+        List[SlowQuery]: Buffered statements with duration and captured plan
+    """
+    return [SlowQuery(**vars(record)) for record in slow_queries.items()]
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries():
+    """Drop all buffered slow queries."""
+    slow_queries.clear()
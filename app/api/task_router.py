@@ -1,25 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from itertools import chain
+from typing import Callable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.dependencies import get_db
+from app.cancellation import RequestCancelled, without_default_deadline
+from app.coalescing import coalesce
+from app.config import settings
+from app.counting import CountMode, count_tasks, task_count_cache
+from app.crud import task as task_crud
+from app.dependencies import get_database
+from app.diagnostics import ProfiledRoute
 from app.models.task import Task as TaskModel
-from app.schemas.task import Task
+from app.schemas.task import Task, TaskBulkResult, TaskBulkUpdate, TaskUpdate
+from app.sharding import Database, merge_by_id
+
+router = APIRouter(route_class=ProfiledRoute)
+
+
+# Response headers carrying the total number of tasks and how it was counted
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_MODE_HEADER = "X-Total-Count-Mode"
+# Response header carrying the ``after_id`` of the next page
+NEXT_AFTER_ID_HEADER = "X-Next-After-Id"
 
-router = APIRouter()
+# Tasks read per query by the export stream
+EXPORT_PAGE_SIZE = 1000
 
 
 @router.get("/tasks", response_model=list[Task])
-def get_tasks(db: Session = Depends(get_db)):
+def get_tasks(
+    response: Response,
+    count: Optional[CountMode] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    database: Database = Depends(get_database),
+):
     """
-    Retrieve all tasks from the database.
+    Retrieve tasks ordered by ID, optionally one keyset page at a time.
+
+    With shards, every shard is queried concurrently for its first ``limit``
+    tasks after ``after_id`` and the pages are merged. Concurrent calls share
+    a single in-flight query. The total number of tasks is returned in the
+    ``X-Total-Count`` header and the mode used to compute it in
+    ``X-Total-Count-Mode``. A full page carries the ``after_id`` of the next
+    one in ``X-Next-After-Id``.
+
+    Args:
+        count (CountMode): How to count tasks, defaults to ``TASK_COUNT_MODE``
+        after_id (int): Only return tasks with a greater ID
+        limit (int): Maximum number of tasks to return, unlimited by default
+        database (Database): Task storage
 
     Returns:
-        List[Task]: A list of all tasks
+        List[Task]: A page of tasks
     """
+    mode = count or CountMode(settings.task_count_mode)
     try:
-        tasks = db.query(TaskModel).all()
+        tasks = coalesce(
+            ("get_tasks", after_id, limit),
+            lambda: merge_by_id(
+                database.scatter(lambda db: _read_page(db, after_id, limit)), limit
+            ),
+        )
+        if limit is not None and len(tasks) == limit:
+            response.headers[NEXT_AFTER_ID_HEADER] = str(tasks[-1].id)
+        if mode is not CountMode.NONE:
+            total, used_mode = coalesce(
+                ("count_tasks", mode), lambda: count_tasks(database, mode)
+            )
+            response.headers[TOTAL_COUNT_HEADER] = str(total)
+            response.headers[TOTAL_COUNT_MODE_HEADER] = used_mode.value
         return tasks
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -27,14 +84,58 @@ def get_tasks(db: Session = Depends(get_db)):
         )
 
 
+@router.get("/tasks/export", dependencies=[Depends(without_default_deadline)])
+def export_tasks(database: Database = Depends(get_database)):
+    """
+    Stream every task as newline-delimited JSON, in ID order.
+
+    Tasks are read one keyset page at a time, so memory stays bounded at any
+    table size. The default request deadline does not apply; the stream
+    stops at the next page when the client disconnects or a deadline set
+    with ``X-Request-Timeout`` expires.
+
+    Args:
+        database (Database): Task storage
+
+    Returns:
+        StreamingResponse: One JSON task per line
+    """
+
+    def read_page(db: Session, after_id: Optional[int]) -> list[Task]:
+        try:
+            return _read_page(db, after_id, EXPORT_PAGE_SIZE)
+        finally:
+            # Release the connection between pages, the stream outlives the
+            # request's session
+            db.rollback()
+
+    def lines():
+        after_id = None
+        try:
+            while True:
+                page = merge_by_id(
+                    database.scatter(lambda db: read_page(db, after_id)),
+                    EXPORT_PAGE_SIZE,
+                )
+                yield "".join(task.model_dump_json() + "\n" for task in page)
+                if len(page) < EXPORT_PAGE_SIZE:
+                    return
+                after_id = page[-1].id
+        except RequestCancelled:
+            # The response has started, the cancellation middleware cuts it off
+            return
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.post("/tasks", response_model=Task)
-def create_task(task: Task, db: Session = Depends(get_db)):
+def create_task(task: Task, database: Database = Depends(get_database)):
     """
     Create a new task in the database.
 
     Args:
         task (Task): Task data to create
-        db (Session): Database session
+        database (Database): Task storage
 
     Returns:
         Task: The created task
@@ -43,30 +144,30 @@ def create_task(task: Task, db: Session = Depends(get_db)):
         HTTPException: 409 if task with same ID exists, 500 for other errors
     """
     try:
-        # Check if task with same ID already exists
-        existing_task = db.query(TaskModel).filter(TaskModel.id == task.id).first()
-        if existing_task:
+        # Check if task with same ID already exists, on any shard it may
+        # still sit on while rebalancing
+        if _load_task(database, task.id) is not None:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Task with ID {task.id} already exists",
             )
 
-        db_task = TaskModel(**task.dict())
-        db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
-        return db_task
+        with database.session(task.id) as db:
+            db_task = TaskModel(**task.dict())
+            db.add(db_task)
+            db.commit()
+            task_count_cache.invalidate()
+            db.refresh(db_task)
+            return Task.model_validate(db_task)
     except HTTPException:
         # Re-raise HTTPExceptions as-is
         raise
     except IntegrityError:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Task with this ID already exists or constraint violation",
         )
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating task: {str(e)}",
@@ -74,13 +175,15 @@ def create_task(task: Task, db: Session = Depends(get_db)):
 
 
 @router.get("/tasks/{task_id}", response_model=Task)
-def get_task(task_id: int, db: Session = Depends(get_db)):
+def get_task(task_id: int, database: Database = Depends(get_database)):
     """
     Retrieve a specific task by ID.
 
+    Concurrent calls for the same ID share a single in-flight query.
+
     Args:
         task_id (int): ID of the task to retrieve
-        db (Session): Database session
+        database (Database): Task storage
 
     Returns:
         Task: The requested task
@@ -89,7 +192,7 @@ def get_task(task_id: int, db: Session = Depends(get_db)):
         HTTPException: 404 if task not found, 500 for other errors
     """
     try:
-        task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
+        task = coalesce(("get_task", task_id), lambda: _load_task(database, task_id))
         if not task:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -103,3 +206,226 @@ def get_task(task_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving task: {str(e)}",
         )
+
+
+@router.patch("/tasks/{task_id}", response_model=Task)
+def update_task(
+    task_id: int, changes: TaskUpdate, database: Database = Depends(get_database)
+):
+    """
+    Update fields of a specific task.
+
+    Args:
+        task_id (int): ID of the task to update
+        changes (TaskUpdate): Fields to change
+        database (Database): Task storage
+
+    Returns:
+        Task: The updated task
+
+    Raises:
+        HTTPException: 404 if task not found, 500 for other errors
+    """
+    try:
+        task = database.find(
+            task_id,
+            lambda db: task_crud.update_task(db, task_id, changes.changed_fields()),
+        )
+        if task is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Task with ID {task_id} not found",
+            )
+        return task
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating task: {str(e)}",
+        )
+
+
+@router.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_task(task_id: int, database: Database = Depends(get_database)):
+    """
+    Delete a specific task.
+
+    Args:
+        task_id (int): ID of the task to delete
+        database (Database): Task storage
+
+    Raises:
+        HTTPException: 404 if task not found, 500 for other errors
+    """
+    try:
+        deleted = database.find(task_id, lambda db: task_crud.delete_task(db, task_id))
+        task_count_cache.invalidate()
+        if not deleted:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Task with ID {task_id} not found",
+            )
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting task: {str(e)}",
+        )
+
+
+@router.patch(
+    "/tasks",
+    response_model=TaskBulkResult,
+    dependencies=[Depends(without_default_deadline)],
+)
+def update_tasks(bulk: TaskBulkUpdate, database: Database = Depends(get_database)):
+    """
+    Update every task selected by an ID list or a filter.
+
+    Rows are changed with set-based ``UPDATE`` statements of at most
+    ``BULK_BATCH_SIZE`` rows, each committed on its own. A failure part way
+    leaves earlier batches applied, so the default request deadline does not
+    apply. With shards, each shard is updated concurrently.
+
+    Args:
+        bulk (TaskBulkUpdate): Selector and fields to change
+        database (Database): Task storage
+
+    Returns:
+        TaskBulkResult: Number and, up to ``BULK_MAX_RETURNED_IDS``, IDs of
+            the updated tasks
+
+    Raises:
+        HTTPException: 500 for database errors
+    """
+    try:
+        return _run_bulk(
+            database,
+            bulk.ids,
+            lambda db, group: task_crud.update_tasks(
+                db,
+                bulk.changes.changed_fields(),
+                batch_size=settings.bulk_batch_size,
+                ids=group,
+                criteria=bulk.filter.criteria() if bulk.filter else None,
+                max_ids=settings.bulk_max_returned_ids,
+            ),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating tasks: {str(e)}",
+        )
+
+
+@router.delete(
+    "/tasks",
+    response_model=TaskBulkResult,
+    dependencies=[Depends(without_default_deadline)],
+)
+def delete_tasks(
+    ids: Optional[list[int]] = Query(None),
+    is_completed: Optional[bool] = None,
+    database: Database = Depends(get_database),
+):
+    """
+    Delete every task selected by an ID list or a filter.
+
+    Rows are removed with set-based ``DELETE`` statements of at most
+    ``BULK_BATCH_SIZE`` rows, each committed on its own. As with bulk
+    updates, the default request deadline does not apply.
+
+    Args:
+        ids (List[int]): IDs of the tasks to delete, e.g. ``?ids=1&ids=2``
+        is_completed (bool): Delete tasks with this completion status
+        database (Database): Task storage
+
+    Returns:
+        TaskBulkResult: Number and, up to ``BULK_MAX_RETURNED_IDS``, IDs of
+            the deleted tasks
+
+    Raises:
+        HTTPException: 422 unless exactly one selector is given,
+            500 for database errors
+    """
+    if (ids is None) == (is_completed is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Exactly one of 'ids' or 'is_completed' must be provided",
+        )
+    try:
+        return _run_bulk(
+            database,
+            ids,
+            lambda db, group: task_crud.delete_tasks(
+                db,
+                batch_size=settings.bulk_batch_size,
+                ids=group,
+                criteria=None if ids is not None else {"is_completed": is_completed},
+                max_ids=settings.bulk_max_returned_ids,
+            ),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting tasks: {str(e)}",
+        )
+    finally:
+        # Batches committed before a failure have deleted tasks too
+        task_count_cache.invalidate()
+
+
+def _page_statement(after_id: Optional[int], limit: Optional[int]) -> Select:
+    # Also run by the warm-up, see app.readiness
+    statement = select(TaskModel).order_by(TaskModel.id)
+    if after_id is not None:
+        statement = statement.where(TaskModel.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def _read_page(
+    db: Session, after_id: Optional[int], limit: Optional[int]
+) -> list[Task]:
+    tasks = db.scalars(_page_statement(after_id, limit))
+    return [Task.model_validate(task) for task in tasks]
+
+
+def _load_task(database: Database, task_id: int) -> Optional[Task]:
+    def load(db: Session) -> Optional[Task]:
+        task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
+        return Task.model_validate(task) if task else None
+
+    return database.find(task_id, load)
+
+
+def _run_bulk(
+    database: Database,
+    ids: Optional[list[int]],
+    run: Callable[[Session, Optional[list[int]]], task_crud.BulkResult],
+) -> TaskBulkResult:
+    # ID lists only visit the shards owning them; filters visit every shard
+    if ids is not None:
+        results = database.scatter_ids(ids, run)
+    else:
+        results = database.scatter(lambda db: run(db, None))
+    # Each shard kept its lowest IDs, so the lowest overall are among them
+    affected = sorted(set(chain.from_iterable(result.ids for result in results)))
+    if ids is not None:
+        # Shards return every ID of a list; a task found on two shards while
+        # rebalancing is counted once
+        count = len(affected)
+    else:
+        count = sum(result.count for result in results)
+    affected = affected[: settings.bulk_max_returned_ids]
+    return TaskBulkResult(
+        count=count, ids=affected, ids_truncated=count > len(affected)
+    )
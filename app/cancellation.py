@@ -0,0 +1,387 @@
+"""
+Request deadlines and cancellation of database work.
+
+Every HTTP request runs in a ``CancellationScope`` carrying its deadline;
+routes whose work grows with the table opt out of the default one with the
+``without_default_deadline`` dependency.
+The scope is cancelled when the deadline expires or the client disconnects,
+which interrupts the queries it has in flight through the driver
+(``cancel()`` on PostgreSQL, ``interrupt()`` on SQLite), fails any later
+query, and aborts a response that is still streaming. On PostgreSQL each
+transaction also gets the remaining time as ``statement_timeout``, so the
+server stops the query even if the cancel request is lost.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from enum import Enum
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request header asking for a deadline in milliseconds
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# PostgreSQL error code raised when statement_timeout expires
+QUERY_CANCELED = "57014"
+
+# Non-standard status for requests abandoned by the client, as used by nginx
+CLIENT_CLOSED_REQUEST = 499
+
+SCOPE_INFO_KEY = "cancellation_scope"
+
+
+class CancelReason(str, Enum):
+    DEADLINE = "deadline"
+    DISCONNECT = "disconnect"
+
+
+class RequestCancelled(HTTPException):
+    """The request was cancelled; raised instead of the interrupted query's error."""
+
+
+class DeadlineExceeded(RequestCancelled):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline exceeded",
+        )
+
+
+class ClientDisconnected(RequestCancelled):
+    def __init__(self):
+        super().__init__(
+            status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request"
+        )
+
+
+class _ResponseAborted(Exception):
+    """Raised from ``send`` to stop a response the client will not receive."""
+
+
+class CancellationScope:
+    """
+    Deadline and cancellation state of one request.
+
+    Database connections checked out while the scope is current are attached
+    to it until they are checked in, so ``cancel`` can interrupt whatever
+    they are running. Cancelling and detaching share a lock, so a connection
+    is never interrupted after it went back to the pool.
+    """
+
+    def __init__(self, timeout_ms: int = 0, requested: bool = False):
+        self.deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms else None
+        # Whether the client asked for the deadline, rather than the default
+        self.requested = requested
+        self.reason: Optional[CancelReason] = None
+        self._connections: set = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining_s(self) -> Optional[float]:
+        """Seconds left before the deadline, None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """
+        Raise if the request was cancelled or its deadline passed.
+
+        Raises:
+            RequestCancelled: ``DeadlineExceeded`` or ``ClientDisconnected``
+        """
+        if self.reason is None and self.remaining_s() == 0:
+            # The deadline timer has not fired yet
+            self.cancel(CancelReason.DEADLINE)
+        if self.reason is not None:
+            raise self.error()
+
+    def error(self) -> RequestCancelled:
+        if self.reason is CancelReason.DISCONNECT:
+            return ClientDisconnected()
+        return DeadlineExceeded()
+
+    def lift_default_deadline(self) -> None:
+        """Drop the deadline unless the client asked for it."""
+        if not self.requested:
+            self.deadline = None
+
+    def attach(self, dbapi_connection) -> None:
+        with self._lock:
+            self._connections.add(dbapi_connection)
+
+    def detach(self, dbapi_connection) -> None:
+        with self._lock:
+            self._connections.discard(dbapi_connection)
+
+    def cancel(self, reason: CancelReason) -> None:
+        """Cancel the request and interrupt the queries of its connections."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            for dbapi_connection in self._connections:
+                _interrupt(dbapi_connection)
+        logger.info("Request cancelled: %s", reason.value)
+
+
+_current_scope: ContextVar[Optional[CancellationScope]] = ContextVar(
+    "cancellation_scope", default=None
+)
+
+
+def current_scope() -> Optional[CancellationScope]:
+    return _current_scope.get()
+
+
+def remaining_s() -> Optional[float]:
+    """Seconds left for the current request, None without a deadline."""
+    scope = _current_scope.get()
+    return None if scope is None else scope.remaining_s()
+
+
+def check_cancelled() -> None:
+    """Raise ``RequestCancelled`` if the current request was cancelled."""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.check()
+
+
+async def without_default_deadline() -> None:
+    """
+    Route dependency lifting the default deadline off a request.
+
+    For routes whose work grows with the table, such as exports and bulk
+    writes, which ``REQUEST_TIMEOUT_MS`` would cut off part way. A deadline
+    set with ``X-Request-Timeout`` still applies, and so does cancellation
+    on client disconnect.
+    """
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.lift_default_deadline()
+
+
+def request_timeout_ms(header_value: Optional[str]) -> int:
+    """
+    Resolve a request's deadline from the ``X-Request-Timeout`` header.
+
+    Returns:
+        int: Milliseconds, 0 for no deadline
+
+    Raises:
+        ValueError: If the header is not a positive integer
+    """
+    if header_value is None:
+        return settings.request_timeout_ms
+    try:
+        timeout_ms = int(header_value)
+    except ValueError:
+        timeout_ms = 0
+    if timeout_ms <= 0:
+        raise ValueError(f"{TIMEOUT_HEADER} must be a positive number of milliseconds")
+    if settings.max_request_timeout_ms:
+        timeout_ms = min(timeout_ms, settings.max_request_timeout_ms)
+    return timeout_ms
+
+
+def _interrupt(dbapi_connection) -> None:
+    # psycopg2/psycopg send a cancel request; sqlite3 interrupts in-process
+    interrupt = getattr(dbapi_connection, "cancel", None) or getattr(
+        dbapi_connection, "interrupt", None
+    )
+    if interrupt is None:
+        return
+    try:
+        interrupt()
+    except Exception as e:
+        logger.warning("Could not cancel query: %s", e)
+
+
+def install_cancellation(engine: Engine) -> None:
+    """
+    Let request cancellation interrupt queries running on ``engine``.
+
+    Also sets ``statement_timeout`` from the request deadline at the start of
+    every ORM transaction on PostgreSQL.
+    """
+    if not event.contains(Session, "after_begin", _set_statement_timeout):
+        event.listen(Session, "after_begin", _set_statement_timeout)
+    if event.contains(engine, "checkout", _checkout):
+        return
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
+    event.listen(engine, "before_execute", _before_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.attach(dbapi_connection)
+        # Checkin may happen outside the request context
+        connection_record.info[SCOPE_INFO_KEY] = scope
+
+
+def _checkin(dbapi_connection, connection_record) -> None:
+    if connection_record is None:
+        return
+    scope = connection_record.info.pop(SCOPE_INFO_KEY, None)
+    if scope is not None:
+        scope.detach(dbapi_connection)
+
+
+def _before_execute(conn, clauseelement, multiparams, params, execution_options):
+    # Checked before the cursor listeners run: an error raised from
+    # before_cursor_execute skips handle_error, so other listeners (such as
+    # the slow query log) would never see the statement end
+    check_cancelled()
+
+
+def _handle_error(exception_context) -> Optional[BaseException]:
+    # Report interrupted queries as the cancellation that caused them
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    original = exception_context.original_exception
+    if getattr(original, "pgcode", None) == QUERY_CANCELED and scope.deadline:
+        # statement_timeout may expire just before the deadline timer fires
+        if scope.remaining_s() < 0.05:
+            scope.cancel(CancelReason.DEADLINE)
+    if scope.cancelled:
+        return scope.error()
+    return None
+
+
+def _set_statement_timeout(session, transaction, connection) -> None:
+    if connection.dialect.name != "postgresql":
+        return
+    remaining = remaining_s()
+    if remaining is None:
+        return
+    check_cancelled()
+    timeout_ms = max(1, int(remaining * 1000))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+class _RequestChannel:
+    """
+    Receive and send callables of one request, watched for cancellation.
+
+    ``watch`` reads incoming messages ahead of the app, so a client
+    disconnect is noticed while the endpoint is still running. ``send``
+    cuts off a response that started before the request was cancelled.
+    """
+
+    def __init__(
+        self,
+        receive: Receive,
+        send: Send,
+        cancellation: CancellationScope,
+        cancel: Callable[[CancelReason], None],
+    ):
+        self._receive = receive
+        self._send = send
+        self._cancellation = cancellation
+        self._cancel = cancel
+        # One slot keeps the server's flow control on request bodies
+        self._messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        # Set when the response started before any cancellation
+        self._response_started = False
+        self._response_complete = False
+
+    async def receive(self) -> Message:
+        return await self._messages.get()
+
+    async def send(self, message: Message) -> None:
+        if self._cancellation.cancelled and self._response_started:
+            raise _ResponseAborted()
+        if message["type"] == "http.response.start":
+            self._response_started = not self._cancellation.cancelled
+        elif message["type"] == "http.response.body":
+            self._response_complete = not message.get("more_body", False)
+        await self._send(message)
+
+    async def watch(self) -> None:
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                break
+            await self._messages.put(message)
+        if not self._response_complete:
+            self._cancel(CancelReason.DISCONNECT)
+        # Every later receive() reports the disconnect
+        while True:
+            await self._messages.put(message)
+
+
+class CancellationMiddleware:
+    """
+    Run every HTTP request in a ``CancellationScope``.
+
+    The scope is cancelled when the deadline timer fires or the client
+    disconnects, see ``_RequestChannel``. A response that started before the
+    request was cancelled is cut off at its next chunk; one started
+    afterwards, such as the error reporting the cancellation, is sent in
+    full.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_value = Headers(scope=scope).get(TIMEOUT_HEADER)
+        try:
+            timeout_ms = request_timeout_ms(header_value)
+        except ValueError as e:
+            response = JSONResponse(
+                {"detail": str(e)}, status_code=status.HTTP_400_BAD_REQUEST
+            )
+            await response(scope, receive, send)
+            return
+
+        cancellation = CancellationScope(timeout_ms, requested=header_value is not None)
+        loop = asyncio.get_running_loop()
+
+        def cancel(reason: CancelReason) -> None:
+            # Driver cancel requests may block, keep them off the event loop
+            loop.run_in_executor(None, cancellation.cancel, reason)
+
+        def expire() -> None:
+            # Unless the route lifted the deadline, see without_default_deadline
+            if cancellation.deadline is not None:
+                cancel(CancelReason.DEADLINE)
+
+        channel = _RequestChannel(receive, send, cancellation, cancel)
+        token = _current_scope.set(cancellation)
+        watcher = asyncio.create_task(channel.watch())
+        timer = loop.call_later(timeout_ms / 1000, expire) if timeout_ms else None
+        try:
+            await self.app(scope, channel.receive, channel.send)
+        except _ResponseAborted:
+            logger.info("Aborted response: %s", cancellation.reason.value)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            watcher.cancel()
+            _current_scope.reset(token)
@@ -0,0 +1,139 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+from app.cancellation import RequestCancelled, remaining_s
+from app.config import settings
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    waiters: int = 0
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class SingleFlightStats:
+    # Calls that ran the function
+    executed: int = 0
+    # Calls that received the result of another in-flight call
+    shared: int = 0
+    # Calls that ran the function because of the waiter limit or a timeout
+    fallbacks: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result or exception. Once the call
+    completes the key is released, so results are never reused by later
+    calls. Handlers run in worker threads, so waiting uses threading
+    primitives.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = SingleFlightStats()
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], T],
+        max_waiters: int,
+        timeout: Optional[float],
+        unshared: tuple[type[BaseException], ...] = (),
+    ) -> T:
+        """
+        Run ``fn`` or wait for the in-flight call with the same key.
+
+        Args:
+            key: Identifies identical calls, e.g. route and normalized params
+            fn: Function producing the result; must not depend on the caller
+            max_waiters: Waiters allowed per key; extra callers run ``fn``
+            timeout: Seconds to wait before running ``fn`` independently
+            unshared: Exceptions specific to the caller that ran ``fn``, e.g.
+                its own cancellation; waiters run ``fn`` themselves instead
+
+        Returns:
+            The result of ``fn``, possibly computed for another caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            elif call.waiters >= max_waiters:
+                call = None
+                leader = False
+            else:
+                call.waiters += 1
+                leader = False
+
+        if call is None:
+            return self._run_fallback(fn)
+        if leader:
+            return self._run_leader(key, call, fn)
+
+        if not call.done.wait(timeout):
+            return self._run_fallback(fn)
+        if isinstance(call.error, unshared):
+            return self._run_fallback(fn)
+        with self._lock:
+            self.stats.shared += 1
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run_leader(self, key: Hashable, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self.stats.executed += 1
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _run_fallback(self, fn: Callable[[], T]) -> T:
+        with self._lock:
+            self.stats.executed += 1
+            self.stats.fallbacks += 1
+        return fn()
+
+
+task_reads = SingleFlight()
+
+
+def coalesce(key: Hashable, fn: Callable[[], T]) -> T:
+    """
+    Run a read through the shared ``SingleFlight`` using the configured limits.
+
+    A reader joining an in-flight call may receive data read before a write
+    that completed while it was waiting; callers needing read-your-writes
+    should query directly. Waiters stop waiting at their own request
+    deadline, and do not inherit the cancellation of the leading request.
+    """
+    if not settings.coalesce_reads:
+        return fn()
+    timeout = settings.coalesce_timeout_s
+    remaining = remaining_s()
+    if remaining is not None:
+        timeout = min(timeout, remaining)
+    return task_reads.do(
+        key,
+        fn,
+        max_waiters=settings.coalesce_max_waiters,
+        timeout=timeout,
+        unshared=(RequestCancelled,),
+    )
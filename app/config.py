@@ -0,0 +1,158 @@
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+def _env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_list(name: str) -> list[str]:
+    value = os.getenv(name) or ""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Values of TASK_COUNT_MODE, see app.counting.CountMode
+TASK_COUNT_MODES = ("none", "exact", "estimated", "cached")
+
+
+@dataclass
+class Settings:
+    """
+    Runtime settings read from environment variables.
+
+    Attributes are plain values so tests can override them with
+    ``monkeypatch.setattr(settings, ...)``.
+    """
+
+    database_url: str = field(
+        default_factory=lambda: _env_str(
+            "DATABASE_URL", "postgresql://postgres:postgres@db:5432/taskdb"
+        )
+    )
+    # Comma separated shard URLs, optionally named ("name=url"). When set,
+    # tasks are spread over these databases instead of DATABASE_URL.
+    shard_urls: list[str] = field(default_factory=lambda: _env_list("SHARD_URLS"))
+    # Points per shard on the consistent hash ring.
+    shard_virtual_nodes: int = field(
+        default_factory=lambda: _env_int("SHARD_VIRTUAL_NODES", 64)
+    )
+    # Set while tasks are being rebalanced after a shard list change: tasks
+    # missing from their owning shard are looked up on the other shards.
+    shard_rebalancing: bool = field(
+        default_factory=lambda: _env_bool("SHARD_REBALANCING", False)
+    )
+    # Token required by the admin endpoints and the on-demand profiling header.
+    # Admin endpoints are disabled while it is unset.
+    admin_token: Optional[str] = field(default_factory=lambda: _env_str("ADMIN_TOKEN"))
+    # Fraction of requests (0.0 - 1.0) profiled without an explicit header.
+    profile_sample_rate: float = field(
+        default_factory=lambda: _env_float("PROFILE_SAMPLE_RATE", 0.0)
+    )
+    # Number of profiles and slow queries kept in memory.
+    diagnostics_buffer_size: int = field(
+        default_factory=lambda: _env_int("DIAGNOSTICS_BUFFER_SIZE", 100)
+    )
+    # Statements slower than this are recorded in the slow query log.
+    slow_query_threshold_ms: float = field(
+        default_factory=lambda: _env_float("SLOW_QUERY_THRESHOLD_MS", 200.0)
+    )
+    # Whether slow SELECTs are re-run under EXPLAIN to capture their plan.
+    slow_query_explain: bool = field(
+        default_factory=lambda: _env_bool("SLOW_QUERY_EXPLAIN", True)
+    )
+    # Each statement is explained at most once per this many seconds, so a
+    # burst of slow queries does not double the database load.
+    slow_query_explain_interval_s: float = field(
+        default_factory=lambda: _env_float("SLOW_QUERY_EXPLAIN_INTERVAL_S", 60.0)
+    )
+    # Share one in-flight query between concurrent identical reads.
+    coalesce_reads: bool = field(
+        default_factory=lambda: _env_bool("COALESCE_READS", True)
+    )
+    # Readers allowed to wait on one in-flight query before querying themselves.
+    coalesce_max_waiters: int = field(
+        default_factory=lambda: _env_int("COALESCE_MAX_WAITERS", 1000)
+    )
+    # Seconds a reader waits for the shared result before querying itself.
+    coalesce_timeout_s: float = field(
+        default_factory=lambda: _env_float("COALESCE_TIMEOUT_S", 5.0)
+    )
+    # Rows changed per statement (and transaction) by bulk updates and deletes.
+    bulk_batch_size: int = field(
+        default_factory=lambda: _env_int("BULK_BATCH_SIZE", 1000)
+    )
+    # Changed task IDs listed in a bulk write's response; the count covers all.
+    bulk_max_returned_ids: int = field(
+        default_factory=lambda: _env_int("BULK_MAX_RETURNED_IDS", 1000)
+    )
+    # Total count reported by task lists: none, exact, estimated or cached.
+    task_count_mode: str = field(
+        default_factory=lambda: _env_str("TASK_COUNT_MODE", "estimated")
+    )
+    # Seconds an exact count is reused in the cached count mode.
+    task_count_cache_ttl_s: float = field(
+        default_factory=lambda: _env_float("TASK_COUNT_CACHE_TTL_S", 30.0)
+    )
+    # Pre-fill the pool and warm hot queries before reporting ready.
+    warmup_enabled: bool = field(
+        default_factory=lambda: _env_bool("WARMUP_ENABLED", True)
+    )
+    # Seconds between background database health probes used by /ready.
+    readiness_probe_interval_s: float = field(
+        default_factory=lambda: _env_float("READINESS_PROBE_INTERVAL_S", 5.0)
+    )
+    # Requests are cancelled after this long, including their queries
+    # (0 disables). Clients may ask for another deadline with the
+    # X-Request-Timeout header, capped at max_request_timeout_ms.
+    request_timeout_ms: int = field(
+        default_factory=lambda: _env_int("REQUEST_TIMEOUT_MS", 30000)
+    )
+    max_request_timeout_ms: int = field(
+        default_factory=lambda: _env_int("MAX_REQUEST_TIMEOUT_MS", 120000)
+    )
+    # Migrations give up waiting for a lock after this long (0 disables).
+    migration_lock_timeout_ms: int = field(
+        default_factory=lambda: _env_int("MIGRATION_LOCK_TIMEOUT_MS", 3000)
+    )
+    # Migration statements are cancelled after this long (0 disables).
+    migration_statement_timeout_ms: int = field(
+        default_factory=lambda: _env_int("MIGRATION_STATEMENT_TIMEOUT_MS", 0)
+    )
+    # Attempts made by a migration step failing on a lock or statement timeout.
+    migration_retries: int = field(
+        default_factory=lambda: _env_int("MIGRATION_RETRIES", 5)
+    )
+    # Seconds before the first retry; doubled on every further attempt.
+    migration_retry_delay_s: float = field(
+        default_factory=lambda: _env_float("MIGRATION_RETRY_DELAY_S", 1.0)
+    )
+
+    def __post_init__(self):
+        # Fail at startup rather than on every request using the value
+        if self.task_count_mode not in TASK_COUNT_MODES:
+            raise ValueError(
+                f"TASK_COUNT_MODE must be one of {', '.join(TASK_COUNT_MODES)}, "
+                f"got {self.task_count_mode!r}"
+            )
+
+
+settings = Settings()
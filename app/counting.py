@@ -0,0 +1,121 @@
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.task import Task as TaskModel
+from app.sharding import Database
+
+# Planner estimate of the current row count: rows per page as of the last
+# ANALYZE scaled by the current number of pages, as the planner itself does.
+# This is a catalog lookup, so it costs the same at any table size.
+POSTGRES_ESTIMATE = text(
+    "SELECT CASE "
+    "WHEN c.reltuples < 0 THEN NULL "
+    "WHEN c.relpages = 0 THEN c.reltuples "
+    "ELSE c.reltuples / c.relpages "
+    "* (pg_relation_size(c.oid) / current_setting('block_size')::int) "
+    "END::bigint "
+    "FROM pg_class c WHERE c.oid = to_regclass(:table)"
+)
+
+
+class CountMode(str, Enum):
+    NONE = "none"
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CACHED = "cached"
+
+
+class _CachedCount:
+    """
+    Exact count shared by every request of the process for a TTL.
+
+    ``invalidate`` bumps a generation number. A count started before that
+    may have missed the change, so ``set`` drops it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value: Optional[int] = None
+        self._expires_at = 0.0
+        self._generation = 0
+
+    def get(self) -> Optional[int]:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+            return None
+
+    def generation(self) -> int:
+        """Generation to pass to ``set`` for a count starting now."""
+        with self._lock:
+            return self._generation
+
+    def set(self, value: int, ttl_s: float, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._value = value
+            self._expires_at = time.monotonic() + ttl_s
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+            self._generation += 1
+
+
+task_count_cache = _CachedCount()
+
+
+def count_tasks(database: Database, mode: CountMode) -> tuple[int, CountMode]:
+    """
+    Count tasks using the requested mode, summing the counts of all shards.
+
+    ``estimated`` reads the planner's estimate on PostgreSQL and falls back
+    to an exact count elsewhere, or when the table was never analyzed.
+    ``cached`` reuses an exact count for ``TASK_COUNT_CACHE_TTL_S`` seconds.
+
+    Returns:
+        tuple: The count and the mode actually used to produce it; estimated
+            if any shard's count is an estimate
+    """
+    if mode is CountMode.ESTIMATED:
+        counts = database.scatter(_estimate_or_exact)
+        used_mode = (
+            CountMode.ESTIMATED
+            if any(used is CountMode.ESTIMATED for _, used in counts)
+            else CountMode.EXACT
+        )
+        return sum(count for count, _ in counts), used_mode
+
+    if mode is CountMode.CACHED:
+        cached = task_count_cache.get()
+        if cached is None:
+            generation = task_count_cache.generation()
+            cached = sum(database.scatter(_exact))
+            task_count_cache.set(cached, settings.task_count_cache_ttl_s, generation)
+        return cached, CountMode.CACHED
+
+    return sum(database.scatter(_exact)), CountMode.EXACT
+
+
+def _estimate_or_exact(db: Session) -> tuple[int, CountMode]:
+    estimate = _estimate(db)
+    if estimate is not None:
+        return estimate, CountMode.ESTIMATED
+    return _exact(db), CountMode.EXACT
+
+
+def _exact(db: Session) -> int:
+    return db.execute(select(func.count()).select_from(TaskModel)).scalar_one()
+
+
+def _estimate(db: Session) -> Optional[int]:
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.execute(POSTGRES_ESTIMATE, {"table": TaskModel.__tablename__}).scalar()
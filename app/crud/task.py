@@ -0,0 +1,157 @@
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from app.models.task import Task as TaskModel
+
+# Statements are executed without loading or synchronizing ORM objects
+BULK_OPTIONS = {"synchronize_session": False}
+
+
+class BulkResult(NamedTuple):
+    """Number of rows changed by a bulk write and the first of their IDs."""
+
+    count: int
+    ids: list[int]
+
+
+def update_task(db: Session, task_id: int, values: dict) -> Optional[Row]:
+    """
+    Update a single task with one ``UPDATE ... RETURNING`` statement.
+
+    Returns:
+        Row: The updated task columns, or None if no task has this ID
+    """
+    stmt = (
+        update(TaskModel)
+        .where(TaskModel.id == task_id)
+        .values(**values)
+        .returning(TaskModel.id, TaskModel.title, TaskModel.is_completed)
+    )
+    row = db.execute(stmt, execution_options=BULK_OPTIONS).first()
+    db.commit()
+    return row
+
+
+def delete_task(db: Session, task_id: int) -> bool:
+    """
+    Delete a single task with one ``DELETE ... RETURNING`` statement.
+
+    Returns:
+        bool: False if no task has this ID
+    """
+    stmt = delete(TaskModel).where(TaskModel.id == task_id).returning(TaskModel.id)
+    deleted = db.execute(stmt, execution_options=BULK_OPTIONS).first()
+    db.commit()
+    return deleted is not None
+
+
+def update_tasks(
+    db: Session,
+    values: dict,
+    batch_size: int,
+    ids: Optional[list[int]] = None,
+    criteria: Optional[dict] = None,
+    max_ids: Optional[int] = None,
+) -> BulkResult:
+    """
+    Update the tasks selected by ``ids`` or ``criteria`` in bounded batches.
+
+    Returns:
+        BulkResult: Number of updated tasks and, up to ``max_ids``, their IDs
+    """
+
+    def statement(where: ColumnElement):
+        return update(TaskModel).where(where).values(**values)
+
+    return _run_batched(db, statement, batch_size, ids, criteria, max_ids)
+
+
+def delete_tasks(
+    db: Session,
+    batch_size: int,
+    ids: Optional[list[int]] = None,
+    criteria: Optional[dict] = None,
+    max_ids: Optional[int] = None,
+) -> BulkResult:
+    """
+    Delete the tasks selected by ``ids`` or ``criteria`` in bounded batches.
+
+    Returns:
+        BulkResult: Number of deleted tasks and, up to ``max_ids``, their IDs
+    """
+
+    def statement(where: ColumnElement):
+        return delete(TaskModel).where(where)
+
+    return _run_batched(db, statement, batch_size, ids, criteria, max_ids)
+
+
+def _run_batched(
+    db: Session,
+    statement: Callable[[ColumnElement], object],
+    batch_size: int,
+    ids: Optional[list[int]],
+    criteria: Optional[dict],
+    max_ids: Optional[int],
+) -> BulkResult:
+    """
+    Execute a set-based statement batch by batch, committing after each.
+
+    Each batch is a single ``UPDATE``/``DELETE ... WHERE id IN (...)
+    RETURNING id`` touching at most ``batch_size`` rows, so locks are only
+    held for one batch. Explicit ID lists are chunked; criteria are walked
+    in ID order by a keyset ``SELECT`` of the next batch of IDs, which
+    terminates even when the update makes rows stop matching the criteria.
+    The walk ends when that ``SELECT`` comes back short, not when fewer rows
+    were changed, so rows changed concurrently do not end it early.
+
+    Batches run in ID order and only the lowest ``max_ids`` changed IDs are
+    kept, so memory stays bounded however many rows are changed. Explicit ID
+    lists are already bounded by the caller and keep every changed ID.
+    """
+    if ids is not None:
+        max_ids = None
+    count, affected = 0, []
+
+    def record(batch_ids: list[int]) -> None:
+        nonlocal count
+        count += len(batch_ids)
+        room = len(batch_ids) if max_ids is None else max_ids - len(affected)
+        affected.extend(sorted(batch_ids)[: max(room, 0)])
+
+    if ids is not None:
+        unique_ids = sorted(set(ids))
+        for start in range(0, len(unique_ids), batch_size):
+            chunk = unique_ids[start : start + batch_size]
+            record(_execute(db, statement(TaskModel.id.in_(chunk))))
+        return BulkResult(count, affected)
+
+    filters = [getattr(TaskModel, name) == value for name, value in criteria.items()]
+    last_id = None
+    while True:
+        batch = select(TaskModel.id).where(*filters)
+        if last_id is not None:
+            batch = batch.where(TaskModel.id > last_id)
+        batch = batch.order_by(TaskModel.id).limit(batch_size)
+        batch_ids = list(db.scalars(batch))
+        if batch_ids:
+            # Rows changed since the SELECT no longer match and are skipped
+            where = and_(TaskModel.id.in_(batch_ids), *filters)
+            record(_execute(db, statement(where)))
+        if len(batch_ids) < batch_size:
+            return BulkResult(count, affected)
+        last_id = batch_ids[-1]
+
+
+def _execute(db: Session, stmt) -> list[int]:
+    batch_ids = list(
+        db.execute(
+            stmt.returning(TaskModel.id), execution_options=BULK_OPTIONS
+        ).scalars()
+    )
+    db.commit()
+    return batch_ids
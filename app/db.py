@@ -1,7 +1,25 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "postgresql://postgres:postgres@db:5432/taskdb"
+from app.cancellation import install_cancellation
+from app.config import settings
+from app.diagnostics import install_slow_query_log
+from app.sharding import ShardedDatabase
+
+SQLALCHEMY_DATABASE_URL = settings.database_url
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
+install_slow_query_log(engine)
+install_cancellation(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Tasks are spread over SHARD_URLS when set, see app.sharding
+shards = (
+    ShardedDatabase.from_urls(
+        settings.shard_urls,
+        settings.shard_virtual_nodes,
+        rebalancing=settings.shard_rebalancing,
+    )
+    if settings.shard_urls
+    else None
+)
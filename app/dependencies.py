@@ -1,4 +1,12 @@
-from app.db import SessionLocal
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal, shards
+from app.diagnostics import is_admin_token
+from app.sharding import Database, SingleDatabase
 
 
 def get_db():
@@ -7,3 +15,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_database(db: Session = Depends(get_db)) -> Database:
+    """
+    Task storage for the request.
+
+    Returns:
+        Database: The configured shards, or the request session when
+            ``SHARD_URLS`` is unset
+    """
+    return shards if shards is not None else SingleDatabase(db)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Guard admin endpoints behind the ``X-Admin-Token`` header.
+
+    Raises:
+        HTTPException: 403 if admin endpoints are disabled or the token is wrong
+    """
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled",
+        )
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token",
+        )
@@ -0,0 +1,375 @@
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+# Request header carrying the admin token to profile a single request
+PROFILE_HEADER = "X-Profile"
+# Response header pointing at the stored profile
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Prefix used to capture a query plan, per SQLAlchemy dialect name
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+MAX_PARAMETERS_LENGTH = 1000
+
+# Statements remembered by the EXPLAIN throttle before old entries are pruned
+MAX_THROTTLED_STATEMENTS = 1000
+
+T = TypeVar("T")
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """
+    Check a client supplied token against the configured admin token.
+
+    Returns:
+        bool: False when no admin token is configured
+    """
+    expected = settings.admin_token
+    if not expected or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+class RingBuffer(Generic[T]):
+    """
+    Thread-safe bounded buffer keeping the most recent records.
+
+    Every appended record gets an increasing ``id`` so it can be looked up
+    after older records have been evicted.
+    """
+
+    def __init__(self, maxlen: int):
+        self._items: deque = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def append(self, record: T) -> T:
+        with self._lock:
+            record.id = next(self._ids)
+            self._items.append(record)
+        return record
+
+    def get(self, record_id: int) -> Optional[T]:
+        with self._lock:
+            for record in self._items:
+                if record.id == record_id:
+                    return record
+        return None
+
+    def items(self) -> list[T]:
+        """Return buffered records, newest first."""
+        with self._lock:
+            return list(reversed(self._items))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+@dataclass
+class ProfileRecord:
+    method: str
+    path: str
+    status_code: int
+    duration_ms: float
+    stats: dict = field(repr=False)
+    created_at: float = field(default_factory=time.time)
+    id: int = 0
+
+    def render(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """Render the profile as a pstats text report."""
+        stream = io.StringIO()
+        stats = pstats.Stats(_StatsSnapshot(self.stats), stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self) -> bytes:
+        """Serialize the profile in the format written by ``cProfile -o``."""
+        return marshal.dumps(self.stats)
+
+
+@dataclass
+class SlowQueryRecord:
+    statement: str
+    parameters: str
+    duration_ms: float
+    plan: Optional[str] = None
+    explain_error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    id: int = 0
+
+
+class _StatsSnapshot:
+    """Adapter letting ``pstats.Stats`` load an already collected stats dict."""
+
+    def __init__(self, stats: dict):
+        self.stats = dict(stats)
+
+    def create_stats(self) -> None:
+        pass
+
+
+class ExplainThrottle:
+    """
+    Allow one EXPLAIN per statement per interval.
+
+    Slow queries come in bursts during an incident; re-running each of them
+    under ``EXPLAIN ANALYZE`` would double the load on an already slow
+    database, while one plan per statement is enough to diagnose it.
+    """
+
+    def __init__(self):
+        self._last_explained: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, statement: str, interval_s: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(statement)
+            if last is not None and now - last < interval_s:
+                return False
+            if len(self._last_explained) >= MAX_THROTTLED_STATEMENTS:
+                self._prune(now, interval_s)
+            self._last_explained[statement] = now
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._last_explained.clear()
+
+    def _prune(self, now: float, interval_s: float) -> None:
+        self._last_explained = {
+            statement: last
+            for statement, last in self._last_explained.items()
+            if now - last < interval_s
+        }
+        if len(self._last_explained) >= MAX_THROTTLED_STATEMENTS:
+            self._last_explained.clear()
+
+
+profiles: RingBuffer[ProfileRecord] = RingBuffer(settings.diagnostics_buffer_size)
+slow_queries: RingBuffer[SlowQueryRecord] = RingBuffer(settings.diagnostics_buffer_size)
+explain_throttle = ExplainThrottle()
+
+# Profiler of the current request, set by the profiling middleware
+_active_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar(
+    "_active_profile", default=None
+)
+
+
+def should_profile(request: Request) -> bool:
+    """
+    Decide whether a request is profiled.
+
+    A request is profiled when it carries the admin token in the
+    ``X-Profile`` header, or when it is picked by the configured sample rate.
+    """
+    if is_admin_token(request.headers.get(PROFILE_HEADER)):
+        return True
+    rate = settings.profile_sample_rate
+    return rate > 0 and random.random() < rate  # nosec B311
+
+
+class ProfilingMiddleware:
+    """
+    Profile selected requests and store the result in the profile buffer.
+
+    The profiler is handed to the endpoint through a context variable and
+    enabled by ``ProfiledRoute`` in the thread that runs the endpoint. The
+    endpoint has returned by the time the response starts, so the profile is
+    stored then and its ID added to the response headers. Unprofiled
+    requests are passed straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not should_profile(Request(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                record = self._store(scope, message["status"], profile, start)
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = str(record.id)
+            await send(message)
+
+        token = _active_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active_profile.reset(token)
+
+    @staticmethod
+    def _store(
+        scope: Scope, status_code: int, profile: cProfile.Profile, start: float
+    ) -> ProfileRecord:
+        duration_ms = (time.perf_counter() - start) * 1000
+        profile.create_stats()
+        return profiles.append(
+            ProfileRecord(
+                method=scope["method"],
+                path=scope["path"],
+                status_code=status_code,
+                duration_ms=duration_ms,
+                stats=profile.stats,
+            )
+        )
+
+
+def profiled(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint so it runs under the active request profiler, if any.
+
+    Sync endpoints run in a worker thread and ``cProfile`` only sees the
+    thread it is enabled in, so the profiler is switched on here rather than
+    in the middleware.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _active_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        return profile.runcall(endpoint, *args, **kwargs)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class running its endpoint under the request profiler."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+
+def install_slow_query_log(engine: Engine) -> None:
+    """
+    Record statements slower than the configured threshold on ``engine``.
+
+    Slow SELECT statements are re-run under ``EXPLAIN`` to capture their
+    plan, at most once per statement per ``SLOW_QUERY_EXPLAIN_INTERVAL_S``.
+    On PostgreSQL this is ``EXPLAIN (ANALYZE, BUFFERS)``, which executes the
+    query a second time inside a savepoint that is always rolled back.
+    """
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+    if duration_ms < settings.slow_query_threshold_ms:
+        return
+
+    plan = explain_error = None
+    if (
+        settings.slow_query_explain
+        and not executemany
+        and statement.lstrip()[:6].upper() == "SELECT"
+        and explain_throttle.allow(statement, settings.slow_query_explain_interval_s)
+    ):
+        try:
+            plan = _explain(conn.dialect.name, cursor, statement, parameters)
+        except Exception as e:
+            explain_error = str(e)
+
+    slow_queries.append(
+        SlowQueryRecord(
+            statement=statement,
+            parameters=repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            duration_ms=duration_ms,
+            plan=plan,
+            explain_error=explain_error,
+        )
+    )
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+
+def _explain(dialect_name: str, cursor, statement: str, parameters) -> Optional[str]:
+    """
+    Run ``statement`` under EXPLAIN on the raw DBAPI connection.
+
+    The raw cursor bypasses engine events, so the EXPLAIN itself is never
+    logged. On PostgreSQL it runs inside a savepoint so a failing EXPLAIN
+    cannot abort the caller's transaction.
+    """
+    prefix = EXPLAIN_PREFIXES.get(dialect_name)
+    if prefix is None:
+        return None
+
+    dbapi_connection = cursor.connection
+    use_savepoint = dialect_name == "postgresql" and not getattr(
+        dbapi_connection, "autocommit", False
+    )
+    explain_cursor = dbapi_connection.cursor()
+    try:
+        if use_savepoint:
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+        finally:
+            if use_savepoint:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        explain_cursor.close()
+    return "\n".join(str(row[-1]) for row in rows)
@@ -1,20 +1,59 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer
 
+from app.api.admin_router import router as admin_router
 from app.api.task_router import router as task_router
+from app.cancellation import CancellationMiddleware
+from app.config import settings
+from app.db import shards
+from app.dependencies import get_db
+from app.diagnostics import ProfilingMiddleware
+from app.readiness import ReadinessMonitor, readiness
 
 # Security scheme for API documentation
 security = HTTPBearer()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm the worker up in the background and probe the database for /ready.
+
+    Warm-up runs after startup so /health answers immediately while /ready
+    reports 503 until the pool is filled and hot queries are compiled.
+    With shards, every shard is warmed up and probed, and their connections
+    are closed on shutdown.
+    """
+    monitor = ReadinessMonitor(
+        app,
+        (
+            shards.dependencies()
+            if shards is not None
+            else [app.dependency_overrides.get(get_db, get_db)]
+        ),
+        interval_s=settings.readiness_probe_interval_s,
+        warm_up_enabled=settings.warmup_enabled,
+    )
+    monitor.start()
+    yield
+    monitor.stop()
+    if shards is not None:
+        shards.dispose()
+
+
 app = FastAPI(
     title="Stacking PR Task API",
     description="A FastAPI application for task management with database integration",
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add security middleware (allow testserver for testing)
@@ -36,11 +75,24 @@ app.add_middleware(
         "http://localhost:8080",
     ],  # Add your frontend origins
     allow_credentials=False,  # Set to True if you need credentials
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Total-Count",
+        "X-Total-Count-Mode",
+        "X-Next-After-Id",
+        "X-Profile-Id",
+    ],
 )
 
+# Opt-in per-request profiling, see app.diagnostics
+app.add_middleware(ProfilingMiddleware)
+
+# Request deadlines and cancellation on client disconnect, see app.cancellation
+app.add_middleware(CancellationMiddleware)
+
 app.include_router(task_router, prefix="/api/v1", tags=["tasks"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/", tags=["health"])
@@ -65,6 +117,26 @@ def health_check():
     return {"status": "healthy", "service": "stacking-pr-api", "version": "0.1.0"}
 
 
+@app.get("/ready", tags=["health"])
+def readiness_check():
+    """
+    Readiness endpoint for load balancers and container health checks.
+
+    Reports ready once warm-up finished and the latest background database
+    probe succeeded; the database is not queried per call.
+
+    Returns:
+        JSONResponse: 200 when ready to serve traffic, 503 otherwise
+    """
+    ready, details = readiness.status(settings.readiness_probe_interval_s)
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={"status": "ready" if ready else "not ready", **details},
+    )
+
+
 def main():
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
 
@@ -0,0 +1,286 @@
+"""
+Helpers for zero-downtime Alembic migrations.
+
+Schema changes on a busy table must not queue behind, or in front of,
+application traffic. These helpers keep lock waits short and retry them,
+build indexes without blocking writes, and backfill data in small committed
+batches whose progress survives a restart.
+"""
+
+import logging
+import time
+from typing import Callable, Optional, Sequence, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from alembic import context, op
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# PostgreSQL error codes raised by lock_timeout and statement_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+QUERY_CANCELED = "57014"
+
+PROGRESS_TABLE = "migration_progress"
+
+
+def is_lock_timeout(error: DBAPIError) -> bool:
+    """Check whether an error was caused by a lock or statement timeout."""
+    pgcode = getattr(error.orig, "pgcode", None)
+    if pgcode in (LOCK_NOT_AVAILABLE, QUERY_CANCELED):
+        return True
+    return "database is locked" in str(error.orig)
+
+
+def run_with_lock_retry(
+    fn: Callable[[], T],
+    retries: Optional[int] = None,
+    delay_s: Optional[float] = None,
+) -> T:
+    """
+    Call ``fn``, retrying with exponential backoff when it times out on a lock.
+
+    Combined with a short ``lock_timeout`` this turns "wait behind a long
+    transaction while blocking everyone queued behind us" into several
+    short attempts that let traffic through in between.
+
+    Args:
+        fn: Migration step; it must be safe to re-run after a timeout
+        retries: Attempts before giving up, defaults to ``MIGRATION_RETRIES``
+        delay_s: First backoff, defaults to ``MIGRATION_RETRY_DELAY_S``
+    """
+    retries = settings.migration_retries if retries is None else retries
+    delay_s = settings.migration_retry_delay_s if delay_s is None else delay_s
+    for attempt in range(1, retries + 1):
+        try:
+            return fn()
+        except DBAPIError as e:
+            if attempt == retries or not is_lock_timeout(e):
+                raise
+            logger.warning(
+                "Lock timeout on attempt %d/%d, retrying in %.1fs",
+                attempt,
+                retries,
+                delay_s,
+            )
+            time.sleep(delay_s)
+            delay_s *= 2
+
+
+def set_timeouts(
+    connection: Connection,
+    lock_timeout_ms: Optional[int] = None,
+    statement_timeout_ms: Optional[int] = None,
+) -> None:
+    """
+    Set session-level ``lock_timeout`` and ``statement_timeout`` on PostgreSQL.
+
+    Defaults come from ``MIGRATION_LOCK_TIMEOUT_MS`` and
+    ``MIGRATION_STATEMENT_TIMEOUT_MS``. Other databases are left untouched.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    if lock_timeout_ms is None:
+        lock_timeout_ms = settings.migration_lock_timeout_ms
+    if statement_timeout_ms is None:
+        statement_timeout_ms = settings.migration_statement_timeout_ms
+    connection.execute(text(f"SET lock_timeout = {int(lock_timeout_ms)}"))
+    connection.execute(text(f"SET statement_timeout = {int(statement_timeout_ms)}"))
+
+
+def create_index_concurrently(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    **kwargs,
+) -> None:
+    """
+    Create an index without blocking writes to the table.
+
+    On PostgreSQL the index is built with ``CREATE INDEX CONCURRENTLY``
+    outside the migration transaction. An invalid index left behind by an
+    earlier failed build is dropped first, so the migration can be re-run;
+    ``alembic/env.py`` already retries it on lock timeouts. In offline
+    (``--sql``) mode the index is dropped unconditionally, as there is no
+    database to inspect. Other databases get a regular ``CREATE INDEX``.
+    """
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index(
+            index_name, table_name, columns, unique=unique, if_not_exists=True
+        )
+        return
+
+    with op.get_context().autocommit_block():
+        _drop_invalid_index(index_name)
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=unique,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            **kwargs,
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """Drop an index without blocking the table on PostgreSQL."""
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(index_name, table_name=table_name, if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def _drop_invalid_index(index_name: str) -> None:
+    drop = text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+    if context.is_offline_mode():
+        # A SQL script cannot look the index up; the CREATE that follows
+        # rebuilds it if it was valid
+        op.execute(drop)
+        return
+    invalid = op.get_bind().execute(
+        text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": index_name},
+    )
+    if invalid.first() is not None:
+        logger.warning("Dropping invalid index %s left by a failed build", index_name)
+        op.execute(drop)
+
+
+def batched_backfill(
+    connection: Connection,
+    job: str,
+    table_name: str,
+    set_clause: str,
+    where_clause: Optional[str] = None,
+    key_column: str = "id",
+    batch_size: int = 1000,
+    pause_s: float = 0.0,
+    on_batch: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Update a table in key order, one small committed batch at a time.
+
+    Progress is recorded per ``job`` in the ``migration_progress`` table, so
+    an interrupted backfill resumes after the last committed batch. On a
+    regular connection each batch and its progress row commit together; in
+    an Alembic ``autocommit_block`` every statement commits on its own and a
+    batch may be re-run after a crash, so ``set_clause`` should be idempotent.
+
+    Args:
+        connection: Connection to run on; it is committed after every batch
+        job: Unique name identifying this backfill in the progress table
+        table_name: Table to update
+        set_clause: SQL assignments, e.g. ``"title_length = length(title)"``
+        where_clause: Optional SQL condition restricting the updated rows
+        key_column: Unique, indexed column used to walk the table
+        batch_size: Rows per batch; keeps row locks and transactions short
+        pause_s: Sleep between batches to leave headroom for live traffic
+        on_batch: Called with ``(last_key, rows_done)`` after every batch
+
+    Returns:
+        int: Rows updated by the whole job, including earlier runs
+    """
+    _ensure_progress_table(connection)
+    progress = connection.execute(
+        text(
+            f"SELECT last_key, rows_done, completed FROM {PROGRESS_TABLE} "
+            "WHERE job = :job"
+        ),
+        {"job": job},
+    ).first()
+    if progress is None:
+        connection.execute(
+            text(
+                f"INSERT INTO {PROGRESS_TABLE} (job, last_key, rows_done, completed) "
+                "VALUES (:job, NULL, 0, :completed)"
+            ),
+            {"job": job, "completed": False},
+        )
+        last_key, rows_done, completed = None, 0, False
+    else:
+        last_key, rows_done, completed = progress
+    _commit(connection)
+    if completed:
+        logger.info("Backfill %s already completed", job)
+        return rows_done
+
+    condition = f" AND ({where_clause})" if where_clause else ""
+    while True:
+        after = "" if last_key is None else f"WHERE {key_column} > :last_key "
+        upper = connection.execute(
+            text(
+                f"SELECT MAX({key_column}) FROM (SELECT {key_column} FROM "
+                f"{table_name} {after}ORDER BY {key_column} LIMIT :batch_size) "
+                "AS batch"
+            ),
+            {"last_key": last_key, "batch_size": batch_size},
+        ).scalar()
+        if upper is None:
+            break
+
+        lower = "" if last_key is None else f"{key_column} > :last_key AND "
+        updated = connection.execute(
+            text(
+                f"UPDATE {table_name} SET {set_clause} "
+                f"WHERE {lower}{key_column} <= :upper{condition}"
+            ),
+            {"last_key": last_key, "upper": upper},
+        ).rowcount
+        last_key, rows_done = upper, rows_done + updated
+        connection.execute(
+            text(
+                f"UPDATE {PROGRESS_TABLE} SET last_key = :last_key, "
+                "rows_done = :rows_done WHERE job = :job"
+            ),
+            {"job": job, "last_key": last_key, "rows_done": rows_done},
+        )
+        _commit(connection)
+        logger.info("Backfill %s: %d rows, up to key %s", job, rows_done, last_key)
+        if on_batch is not None:
+            on_batch(last_key, rows_done)
+        if pause_s:
+            time.sleep(pause_s)
+
+    connection.execute(
+        text(f"UPDATE {PROGRESS_TABLE} SET completed = :completed WHERE job = :job"),
+        {"job": job, "completed": True},
+    )
+    _commit(connection)
+    return rows_done
+
+
+def _ensure_progress_table(connection: Connection) -> None:
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ("
+            "job VARCHAR(255) PRIMARY KEY, "
+            "last_key BIGINT, "
+            "rows_done BIGINT NOT NULL, "
+            "completed BOOLEAN NOT NULL)"
+        )
+    )
+
+
+def _commit(connection: Connection) -> None:
+    # In AUTOCOMMIT mode every statement is already committed, and the
+    # logical transaction belongs to Alembic's autocommit_block
+    isolation_level = connection.get_execution_options().get("isolation_level")
+    if isolation_level != "AUTOCOMMIT" and connection.in_transaction():
+        connection.commit()
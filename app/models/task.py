@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -6,6 +6,7 @@ Base = declarative_base()
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_is_completed_id", "is_completed", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
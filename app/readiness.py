@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence
+
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.api.task_router import _load_task, _page_statement
+from app.config import settings
+from app.counting import CountMode, count_tasks
+from app.sharding import SingleDatabase
+
+logger = logging.getLogger(__name__)
+
+# Probes older than this many intervals no longer count as healthy
+STALE_PROBE_INTERVALS = 3
+
+
+class Readiness:
+    """Warm-up and database health state reported by ``/ready``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.warmed = False
+            self.db_healthy = False
+            self.last_probe_at: Optional[float] = None
+            self.last_error: Optional[str] = None
+
+    def mark_warmed(self) -> None:
+        with self._lock:
+            self.warmed = True
+
+    def record_probe(self, healthy: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.db_healthy = healthy
+            self.last_probe_at = time.monotonic()
+            self.last_error = error
+
+    def status(self, interval_s: float) -> tuple[bool, dict]:
+        """
+        Report whether the worker should receive traffic.
+
+        Returns:
+            tuple: Readiness flag and details for the response body
+        """
+        with self._lock:
+            probe_age = (
+                None
+                if self.last_probe_at is None
+                else time.monotonic() - self.last_probe_at
+            )
+            fresh = (
+                probe_age is not None
+                and probe_age <= interval_s * STALE_PROBE_INTERVALS
+            )
+            ready = self.warmed and self.db_healthy and fresh
+            return ready, {
+                "warmed": self.warmed,
+                "database": "healthy" if self.db_healthy and fresh else "unhealthy",
+                "last_probe_age_s": probe_age,
+                "error": self.last_error,
+            }
+
+
+readiness = Readiness()
+
+
+@contextmanager
+def _session(get_db: Callable[[], Iterator[Session]]) -> Iterator[Session]:
+    # Drive the get_db dependency (or its override) outside a request
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        yield db
+    finally:
+        db_gen.close()
+
+
+def warm_up(app: FastAPI, *get_dbs: Callable[[], Iterator[Session]]) -> None:
+    """
+    Pay first-request costs before the worker reports ready.
+
+    For every database (one per shard), opens enough connections to fill
+    the pool and runs the hot task queries once, through the endpoints' own
+    helpers, so their SQL is compiled and cached. Then builds the OpenAPI
+    schema.
+    """
+    pool_size = 0
+    for get_db in get_dbs:
+        with _session(get_db) as db:
+            engine = db.get_bind()
+            size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+            connections = [engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.close()
+            pool_size += size
+
+            _warm_up_queries(db)
+            db.rollback()
+
+    app.openapi()
+    readiness.mark_warmed()
+    logger.info("Warm-up complete, %d pooled connections", pool_size)
+
+
+def _warm_up_queries(db: Session) -> None:
+    # Built by the endpoints' own helpers, so the compiled statements match
+    for after_id in (None, 0):
+        for limit in (None, 1):
+            # Every shape of a task page, fetching at most one row
+            db.execute(
+                _page_statement(after_id, limit),
+                execution_options={"stream_results": True},
+            ).first()
+    _load_task(SingleDatabase(db), -1)
+    mode = CountMode(settings.task_count_mode)
+    if mode is not CountMode.NONE:
+        # Cached counts run the exact count; don't cache one shard's total
+        if mode is CountMode.CACHED:
+            mode = CountMode.EXACT
+        count_tasks(SingleDatabase(db), mode)
+
+
+def probe_database(*get_dbs: Callable[[], Iterator[Session]]) -> None:
+    """Run a trivial query on every database and record the outcome for ``/ready``."""
+    try:
+        for get_db in get_dbs:
+            with _session(get_db) as db:
+                db.execute(text("SELECT 1"))
+        readiness.record_probe(True)
+    except Exception as e:
+        logger.warning("Database probe failed: %s", e)
+        readiness.record_probe(False, str(e))
+
+
+class ReadinessMonitor:
+    """
+    Background thread warming the worker up, then probing the database.
+
+    A failed warm-up is retried on every probe interval, so a worker started
+    before its database becomes ready once the database is reachable.
+    """
+
+    def __init__(
+        self,
+        app: FastAPI,
+        get_dbs: Sequence[Callable[[], Iterator[Session]]],
+        interval_s: float,
+        warm_up_enabled: bool = True,
+    ):
+        self.app = app
+        self.get_dbs = get_dbs
+        self.interval_s = interval_s
+        self.warm_up_enabled = warm_up_enabled
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="readiness-monitor", daemon=True
+        )
+
+    def start(self) -> None:
+        readiness.reset()
+        if not self.warm_up_enabled:
+            readiness.mark_warmed()
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if not readiness.warmed:
+                try:
+                    warm_up(self.app, *self.get_dbs)
+                except Exception as e:
+                    logger.warning("Warm-up failed, retrying: %s", e)
+            probe_database(*self.get_dbs)
+            self._stopped.wait(self.interval_s)
@@ -0,0 +1,22 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    status_code: int
+    duration_ms: float
+    created_at: float
+
+
+class SlowQuery(BaseModel):
+    id: int
+    statement: str
+    parameters: str
+    duration_ms: float
+    plan: Optional[str] = None
+    explain_error: Optional[str] = None
+    created_at: float
@@ -1,7 +1,69 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, model_validator
 
 
 class Task(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     title: str
     is_completed: bool = False
+
+
+class TaskUpdate(BaseModel):
+    """Fields to change on a task; fields left out are not touched."""
+
+    title: Optional[str] = None
+    is_completed: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.changed_fields():
+            raise ValueError("At least one field to update must be provided")
+        return self
+
+    def changed_fields(self) -> dict:
+        return self.model_dump(exclude_none=True)
+
+
+class TaskFilter(BaseModel):
+    """Criteria selecting tasks for set-based operations."""
+
+    is_completed: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.criteria():
+            raise ValueError("At least one filter field must be provided")
+        return self
+
+    def criteria(self) -> dict:
+        return self.model_dump(exclude_none=True)
+
+
+class TaskBulkUpdate(BaseModel):
+    """Set-based update of the tasks selected by ``ids`` or ``filter``."""
+
+    ids: Optional[list[int]] = None
+    filter: Optional[TaskFilter] = None
+    changes: TaskUpdate
+
+    @model_validator(mode="after")
+    def check_selector(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Exactly one of 'ids' or 'filter' must be provided")
+        return self
+
+
+class TaskBulkResult(BaseModel):
+    """
+    Outcome of a set-based write.
+
+    ``ids`` lists the lowest changed IDs, at most ``BULK_MAX_RETURNED_IDS``;
+    ``ids_truncated`` is set when ``count`` covers more tasks than it lists.
+    """
+
+    count: int
+    ids: list[int]
+    ids_truncated: bool = False
@@ -0,0 +1,399 @@
+"""
+Horizontal sharding of tasks across several databases.
+
+Tasks are placed on a shard by a consistent hash of their ID, so adding a
+shard only moves the tasks whose ring segment it takes over. Reads of a
+single task go to its shard; listings and counts fan out to every shard
+concurrently and are merged in ID order.
+
+Run ``python -m app.sharding rebalance`` after adding or removing a shard
+in ``SHARD_URLS`` to move tasks to their new owner. Deploy the new shard
+list to every worker first, so no write lands on a task's old shard, with
+``SHARD_REBALANCING`` set until the rebalance is done, so tasks that have
+not moved yet are still found.
+"""
+
+import argparse
+import bisect
+import contextvars
+import hashlib
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, Sequence, TypeVar, Union
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.cancellation import install_cancellation
+from app.config import settings
+from app.diagnostics import install_slow_query_log
+from app.models.task import Task as TaskModel
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Concurrent shard queries allowed per shard, shared by all requests
+FANOUT_WORKERS_PER_SHARD = 8
+
+
+def _hash(value: str) -> int:
+    digest = hashlib.md5(value.encode(), usedforsecurity=False).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping task IDs to shard names."""
+
+    def __init__(self, names: Sequence[str], virtual_nodes: int):
+        if not names:
+            raise ValueError("A hash ring needs at least one shard")
+        points = sorted(
+            (_hash(f"{name}#{index}"), name)
+            for name in names
+            for index in range(virtual_nodes)
+        )
+        self._positions = [position for position, _ in points]
+        self._names = [name for _, name in points]
+
+    def shard_for(self, key: int) -> str:
+        index = bisect.bisect(self._positions, _hash(str(key)))
+        return self._names[index % len(self._names)]
+
+
+def parse_shard_urls(urls: Iterable[str]) -> dict[str, str]:
+    """
+    Parse ``SHARD_URLS`` entries into shard names and URLs.
+
+    Entries are ``name=url`` or a bare URL, named ``shard<position>``. Names
+    place shards on the hash ring, so give them explicitly to keep placement
+    stable when the list is reordered.
+    """
+    shards = {}
+    for position, entry in enumerate(urls):
+        name, separator, url = entry.partition("=")
+        if not separator or ":" in name or "/" in name:
+            name, url = f"shard{position}", entry
+        if name in shards:
+            raise ValueError(f"Duplicate shard name {name!r}")
+        shards[name] = url
+    return shards
+
+
+def merge_by_id(pages: Iterable[list[T]], limit: Optional[int] = None) -> list[T]:
+    """
+    Merge per-shard pages sorted by ID into one page.
+
+    A task seen on two shards while it is being rebalanced is kept once.
+    """
+    merged: list[T] = []
+    for item in heapq.merge(*pages, key=lambda item: item.id):
+        if merged and merged[-1].id == item.id:
+            continue
+        merged.append(item)
+        if limit is not None and len(merged) == limit:
+            break
+    return merged
+
+
+class SingleDatabase:
+    """
+    Unsharded storage: every task lives behind the request session.
+
+    Offers the same interface as ``ShardedDatabase`` so endpoints are
+    written once for both modes.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @contextmanager
+    def session(self, task_id: Optional[int] = None) -> Iterator[Session]:
+        try:
+            yield self.db
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def find(self, task_id: int, fn: Callable[[Session], Optional[T]]) -> Optional[T]:
+        with self.session() as db:
+            return fn(db)
+
+    def scatter(self, fn: Callable[[Session], T]) -> list[T]:
+        with self.session() as db:
+            return [fn(db)]
+
+    def scatter_ids(
+        self, ids: Sequence[int], fn: Callable[[Session, list[int]], T]
+    ) -> list[T]:
+        with self.session() as db:
+            return [fn(db, list(ids))]
+
+
+class ShardedDatabase:
+    """
+    Tasks spread over several databases by consistent hashing of their ID.
+
+    With ``rebalancing`` set, tasks may still sit on the shard that owned
+    them before the shard list changed: lookups by ID that miss on the owner
+    try the other shards, and ID lists are sent to every shard.
+    """
+
+    def __init__(
+        self, engines: dict[str, Engine], virtual_nodes: int, rebalancing: bool = False
+    ):
+        self.engines = engines
+        self.ring = HashRing(list(engines), virtual_nodes)
+        self.rebalancing = rebalancing
+        self._sessionmakers = {
+            name: sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for name, engine in engines.items()
+        }
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_urls(
+        cls, urls: Iterable[str], virtual_nodes: int, rebalancing: bool = False
+    ) -> "ShardedDatabase":
+        engines = {}
+        for name, url in parse_shard_urls(urls).items():
+            connect_args = {}
+            if make_url(url).get_backend_name() == "sqlite":
+                # Shard sessions are used from the fan-out threads
+                connect_args["check_same_thread"] = False
+            engine = create_engine(url, connect_args=connect_args)
+            install_slow_query_log(engine)
+            install_cancellation(engine)
+            engines[name] = engine
+        return cls(engines, virtual_nodes, rebalancing)
+
+    def shard_for(self, task_id: int) -> str:
+        return self.ring.shard_for(task_id)
+
+    @contextmanager
+    def shard_session(self, name: str) -> Iterator[Session]:
+        db = self._sessionmakers[name]()
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def session(self, task_id: int):
+        """Open a session on the shard owning ``task_id``."""
+        return self.shard_session(self.shard_for(task_id))
+
+    def find(self, task_id: int, fn: Callable[[Session], Optional[T]]) -> Optional[T]:
+        """
+        Run ``fn`` on the shard owning ``task_id`` and return its result.
+
+        While rebalancing, a miss (a falsy result) is retried on the other
+        shards in turn, in case the task has not moved to its owner yet, and
+        then on the owner once more.
+        """
+        owner = self.shard_for(task_id)
+        with self.shard_session(owner) as db:
+            result = fn(db)
+        if result or not self.rebalancing:
+            return result
+        # The owner is asked again last: a task moved while we looked
+        # elsewhere is on it by then, see _move
+        others = [name for name in self.engines if name != owner]
+        for name in [*others, owner]:
+            with self.shard_session(name) as db:
+                found = fn(db)
+            if found:
+                return found
+        return result
+
+    def scatter(self, fn: Callable[[Session], T]) -> list[T]:
+        """Run ``fn`` on every shard concurrently, results in shard order."""
+        return self._gather((name, lambda db, fn=fn: fn(db)) for name in self.engines)
+
+    def scatter_ids(
+        self, ids: Sequence[int], fn: Callable[[Session, list[int]], T]
+    ) -> list[T]:
+        """
+        Run ``fn`` concurrently on each shard owning some of ``ids``.
+
+        While rebalancing, every shard gets the whole list.
+        """
+        if self.rebalancing:
+            return self.scatter(lambda db: fn(db, list(ids)))
+        groups: dict[str, list[int]] = defaultdict(list)
+        for task_id in ids:
+            groups[self.shard_for(task_id)].append(task_id)
+        return self._gather(
+            (name, lambda db, group=group: fn(db, group))
+            for name, group in groups.items()
+        )
+
+    def dependencies(self) -> list[Callable[[], Iterator[Session]]]:
+        """One ``get_db``-style generator function per shard."""
+
+        def dependency(name: str):
+            def get_shard_db():
+                with self.shard_session(name) as db:
+                    yield db
+
+            return get_shard_db
+
+        return [dependency(name) for name in self.engines]
+
+    def dispose(self) -> None:
+        """Stop the fan-out threads and close every shard's connections."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for engine in self.engines.values():
+            engine.dispose()
+
+    def _fanout_executor(self) -> ThreadPoolExecutor:
+        # Created on first use, and again after dispose()
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=len(self.engines) * FANOUT_WORKERS_PER_SHARD,
+                    thread_name_prefix="shard",
+                )
+            return self._executor
+
+    def _gather(self, calls: Iterable[tuple[str, Callable[[Session], T]]]) -> list[T]:
+        executor = self._fanout_executor()
+        futures = [
+            # Carry request context (e.g. deadlines) into the worker threads
+            executor.submit(contextvars.copy_context().run, self._run_on, name, call)
+            for name, call in calls
+        ]
+        return [future.result() for future in futures]
+
+    def _run_on(self, name: str, call: Callable[[Session], T]) -> T:
+        with self.shard_session(name) as db:
+            return call(db)
+
+
+# Task storage handed to the endpoints by ``get_database``
+Database = Union[SingleDatabase, ShardedDatabase]
+
+
+def rebalance(
+    database: ShardedDatabase, batch_size: int = 1000, dry_run: bool = False
+) -> dict[str, int]:
+    """
+    Move every task to the shard the hash ring assigns it to.
+
+    Each shard is walked in ID order and misplaced tasks are moved in
+    batches, see ``_move``. Tasks keep being served while they move, and an
+    interrupted run leaves at most a duplicate that the next run removes.
+
+    Returns:
+        dict: Number of tasks moved per ``"source->target"`` pair
+    """
+    moved: dict[str, int] = defaultdict(int)
+    for source in database.engines:
+        last_id = None
+        while True:
+            batch = select(TaskModel.id).order_by(TaskModel.id).limit(batch_size)
+            if last_id is not None:
+                batch = batch.where(TaskModel.id > last_id)
+            with database.shard_session(source) as db:
+                ids = list(db.scalars(batch))
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            misplaced: dict[str, list[int]] = defaultdict(list)
+            for task_id in ids:
+                target = database.shard_for(task_id)
+                if target != source:
+                    misplaced[target].append(task_id)
+            for target, task_ids in misplaced.items():
+                if dry_run:
+                    count = len(task_ids)
+                else:
+                    count = _move(database, source, target, task_ids)
+                moved[f"{source}->{target}"] += count
+                logger.info("Moved %d tasks from %s to %s", count, source, target)
+
+            if len(ids) < batch_size:
+                break
+    return dict(moved)
+
+
+def _move(database: ShardedDatabase, source: str, target: str, ids: list[int]) -> int:
+    """
+    Move tasks from ``source`` to ``target``, returning how many moved.
+
+    The tasks are deleted from the source with ``DELETE ... RETURNING`` and
+    the rows it returns, not an earlier read, are copied to the target
+    before the delete commits. The delete keeps the source rows locked until
+    then, so a concurrent write either lands first and is copied, or waits
+    and then finds the task gone from the source. IDs the target already
+    holds are kept as they are: they are copies left by an interrupted run,
+    which the endpoints have been writing to since.
+    """
+    columns = (TaskModel.id, TaskModel.title, TaskModel.is_completed)
+    with database.shard_session(source) as source_db:
+        rows = [
+            row._asdict()
+            for row in source_db.execute(
+                delete(TaskModel).where(TaskModel.id.in_(ids)).returning(*columns),
+                execution_options={"synchronize_session": False},
+            )
+        ]
+        if rows:
+            returned = [row["id"] for row in rows]
+            with database.shard_session(target) as db:
+                existing = set(
+                    db.scalars(select(TaskModel.id).where(TaskModel.id.in_(returned)))
+                )
+                missing = [row for row in rows if row["id"] not in existing]
+                if missing:
+                    db.execute(insert(TaskModel), missing)
+                db.commit()
+        source_db.commit()
+    return len(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.sharding", description="Manage task shards"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebalance_parser = commands.add_parser(
+        "rebalance", help="Move tasks to the shard that owns them"
+    )
+    rebalance_parser.add_argument(
+        "--batch-size", type=int, default=settings.bulk_batch_size
+    )
+    rebalance_parser.add_argument(
+        "--dry-run", action="store_true", help="Only report what would move"
+    )
+    args = parser.parse_args(argv)
+
+    if not settings.shard_urls:
+        parser.error("SHARD_URLS is not set")
+    database = ShardedDatabase.from_urls(
+        settings.shard_urls, settings.shard_virtual_nodes
+    )
+    try:
+        moved = rebalance(database, args.batch_size, args.dry_run)
+    finally:
+        database.dispose()
+    action = "Would move" if args.dry_run else "Moved"
+    for route, count in sorted(moved.items()):
+        print(f"{action} {count} tasks {route}")
+    print(f"{action} {sum(moved.values())} tasks in total")
+
+
+if __name__ == "__main__":
+    main()
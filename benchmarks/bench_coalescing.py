@@ -0,0 +1,114 @@
+"""
+Benchmark read coalescing on ``GET /api/v1/tasks``.
+
+Fires bursts of identical concurrent requests against a seeded SQLite file
+and counts the task queries reaching the database, with coalescing on and
+off. With coalescing on, the query count stays flat as concurrency rises.
+
+Usage:
+    python -m benchmarks.bench_coalescing [--rows N] [--rounds N]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.dependencies import get_db
+from app.main import app
+from app.models.task import Base
+from app.models.task import Task as TaskModel
+
+CONCURRENCY_LEVELS = [1, 8, 32, 64, 128]
+
+
+def seed(engine, rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(TaskModel),
+            [
+                {"id": i, "title": f"Task {i}", "is_completed": i % 2 == 0}
+                for i in range(1, rows + 1)
+            ],
+        )
+
+
+def burst(client: TestClient, concurrency: int) -> float:
+    """Send ``concurrency`` simultaneous requests, return wall time in ms."""
+    barrier = threading.Barrier(concurrency)
+
+    def request(_):
+        barrier.wait()
+        response = client.get("/api/v1/tasks")
+        response.raise_for_status()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(concurrency)))
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"check_same_thread": False},
+            pool_size=max(CONCURRENCY_LEVELS),
+        )
+        seed(engine, args.rows)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        queries = 0
+        lock = threading.Lock()
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_queries(conn, cursor, statement, *_):
+            nonlocal queries
+            if statement.startswith("SELECT") and "FROM tasks" in statement:
+                with lock:
+                    queries += 1
+
+        app.dependency_overrides[get_db] = override_get_db
+        print(f"rows={args.rows} rounds={args.rounds}")
+        print(f"{'coalesce':>8} {'clients':>8} {'queries/burst':>14} {'ms/burst':>10}")
+        try:
+            with TestClient(app) as client:
+                for coalesce_reads in (False, True):
+                    settings.coalesce_reads = coalesce_reads
+                    for concurrency in CONCURRENCY_LEVELS:
+                        queries = 0
+                        elapsed = sum(
+                            burst(client, concurrency) for _ in range(args.rounds)
+                        )
+                        print(
+                            f"{str(coalesce_reads):>8} {concurrency:>8} "
+                            f"{queries / args.rounds:>14.1f} "
+                            f"{elapsed / args.rounds:>10.1f}"
+                        )
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark exact and estimated task counts as the table grows.
+
+Requires PostgreSQL. Tasks are written to a scratch ``bench_count`` schema
+of the database in ``DATABASE_URL`` (or ``--url``), which is dropped
+afterwards. The estimated count is a catalog lookup, so its latency stays
+constant while the exact ``COUNT(*)`` grows with the table.
+
+Usage:
+    python -m benchmarks.bench_task_count [--max-rows N] [--repeat N]
+"""
+
+import argparse
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.counting import CountMode, count_tasks
+from app.models.task import Base
+from app.sharding import SingleDatabase
+
+SCHEMA = "bench_count"
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000, 50_000_000]
+
+
+def timed(db: Session, mode: CountMode, repeat: int) -> tuple[float, int, str]:
+    """Return the median latency in ms, the count and the mode used."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total, used = count_tasks(SingleDatabase(db), mode)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), total, used.value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=settings.database_url)
+    parser.add_argument("--max-rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    admin = create_engine(args.url)
+    if admin.dialect.name != "postgresql":
+        raise SystemExit("Estimated counts need PostgreSQL, got " + admin.dialect.name)
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+    engine = create_engine(
+        args.url, connect_args={"options": f"-csearch_path={SCHEMA}"}
+    )
+    try:
+        Base.metadata.create_all(bind=engine)
+        print(
+            f"{'rows':>12} {'exact ms':>10} {'estimated ms':>13} "
+            f"{'estimate':>12} {'error %':>8}"
+        )
+        rows = 0
+        for size in [size for size in SIZES if size <= args.max_rows]:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "INSERT INTO tasks (id, title, is_completed) "
+                        "SELECT i, 'Task ' || i, i % 2 = 0 "
+                        "FROM generate_series(:start, :stop) AS i"
+                    ),
+                    {"start": rows + 1, "stop": size},
+                )
+            rows = size
+            with engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            ) as conn:
+                conn.execute(text("VACUUM ANALYZE tasks"))
+
+            with Session(engine) as db:
+                exact_ms, exact, _ = timed(db, CountMode.EXACT, args.repeat)
+                estimated_ms, estimate, used = timed(
+                    db, CountMode.ESTIMATED, args.repeat
+                )
+            error = abs(estimate - exact) / exact * 100
+            print(
+                f"{rows:>12,} {exact_ms:>10.2f} {estimated_ms:>13.2f} "
+                f"{estimate:>12,} {error:>8.2f}"
+                + ("" if used == "estimated" else f" ({used})")
+            )
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        admin.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import marshal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.diagnostics import SlowQueryRecord, profiles, slow_queries
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Enable admin endpoints and return the headers to reach them"""
+    monkeypatch.setattr(settings, "admin_token", ADMIN_TOKEN)
+    profiles.clear()
+    slow_queries.clear()
+    yield {"X-Admin-Token": ADMIN_TOKEN}
+    profiles.clear()
+    slow_queries.clear()
+
+
+def test_admin_disabled_without_token(client: TestClient, monkeypatch):
+    """Test admin endpoints are disabled when no token is configured"""
+    monkeypatch.setattr(settings, "admin_token", None)
+    response = client.get("/admin/profiles", headers={"X-Admin-Token": "x"})
+    assert response.status_code == 403
+    assert "disabled" in response.json()["detail"]
+
+
+def test_admin_rejects_invalid_token(client: TestClient, admin_headers):
+    """Test admin endpoints reject a wrong token"""
+    response = client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+    assert "Invalid" in response.json()["detail"]
+
+
+def test_profile_request_on_demand(client: TestClient, admin_headers):
+    """Test a request carrying the profile header is profiled"""
+    response = client.get("/api/v1/tasks", headers={"X-Profile": ADMIN_TOKEN})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    response = client.get("/admin/profiles", headers=admin_headers)
+    assert response.status_code == 200
+    (summary,) = response.json()
+    assert summary["id"] == int(profile_id)
+    assert summary["method"] == "GET"
+    assert summary["path"] == "/api/v1/tasks"
+    assert summary["status_code"] == 200
+
+    response = client.get(f"/admin/profiles/{profile_id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert "get_tasks" in response.text
+
+    response = client.get(
+        f"/admin/profiles/{profile_id}?format=pstats", headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    stats = marshal.loads(response.content)
+    assert any(func[2] == "get_tasks" for func in stats)
+
+
+def test_unprofiled_request(client: TestClient, admin_headers):
+    """Test requests are not profiled without the header or sampling"""
+    response = client.get("/api/v1/tasks", headers={"X-Profile": "wrong"})
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert profiles.items() == []
+
+
+def test_profile_sampling(client: TestClient, admin_headers, monkeypatch):
+    """Test requests are profiled by sample rate"""
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    response = client.get("/api/v1/tasks")
+    assert "X-Profile-Id" in response.headers
+
+
+def test_get_profile_not_found(client: TestClient, admin_headers):
+    """Test downloading an unknown profile"""
+    response = client.get("/admin/profiles/999", headers=admin_headers)
+    assert response.status_code == 404
+
+
+def test_clear_profiles(client: TestClient, admin_headers):
+    """Test clearing buffered profiles"""
+    client.get("/api/v1/tasks", headers={"X-Profile": ADMIN_TOKEN})
+    response = client.delete("/admin/profiles", headers=admin_headers)
+    assert response.status_code == 204
+    assert profiles.items() == []
+
+
+def test_list_and_clear_slow_queries(client: TestClient, admin_headers):
+    """Test slow queries are served and cleared by the admin endpoints"""
+    slow_queries.append(
+        SlowQueryRecord(
+            statement="SELECT 1", parameters="()", duration_ms=250.0, plan="SCAN"
+        )
+    )
+
+    response = client.get("/admin/slow-queries", headers=admin_headers)
+    assert response.status_code == 200
+    (query,) = response.json()
+    assert query["statement"] == "SELECT 1"
+    assert query["duration_ms"] == 250.0
+    assert query["plan"] == "SCAN"
+
+    response = client.delete("/admin/slow-queries", headers=admin_headers)
+    assert response.status_code == 204
+    assert slow_queries.items() == []
@@ -1,10 +1,18 @@
+import concurrent.futures
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 
+from app.config import settings
+from app.counting import task_count_cache
+from app.crud import task as task_crud
 from app.models.task import Task as TaskModel
+from tests.conftest import engine
 
 
 def test_get_tasks_empty(client: TestClient):
@@ -102,3 +110,247 @@ def test_get_task_not_found(client: TestClient):
     response = client.get("/api/v1/tasks/999")
     assert response.status_code == 404
     assert "not found" in response.json()["detail"]
+
+
+def test_concurrent_reads_share_one_query(client: TestClient, sample_task_data):
+    """Test concurrent identical reads are served by a single query"""
+    client.post("/api/v1/tasks", json=sample_task_data)
+    queries = []
+
+    def slow_task_select(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "FROM tasks" in statement:
+            queries.append(statement)
+            time.sleep(0.2)
+
+    barrier = threading.Barrier(10)
+
+    def get_tasks():
+        barrier.wait()
+        return client.get("/api/v1/tasks")
+
+    event.listen(engine, "before_cursor_execute", slow_task_select)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+            responses = list(executor.map(lambda _: get_tasks(), range(10)))
+    finally:
+        event.remove(engine, "before_cursor_execute", slow_task_select)
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(len(response.json()) == 1 for response in responses)
+    assert len(queries) < 10
+
+
+def create_tasks(client: TestClient, count: int, completed_every: int = 2):
+    """Create tasks 1..count, every ``completed_every``-th one completed"""
+    for task_id in range(1, count + 1):
+        client.post(
+            "/api/v1/tasks",
+            json={
+                "id": task_id,
+                "title": f"Task {task_id}",
+                "is_completed": task_id % completed_every == 0,
+            },
+        )
+
+
+def test_update_task(client: TestClient, sample_task_data):
+    """Test partially updating a task"""
+    client.post("/api/v1/tasks", json=sample_task_data)
+
+    response = client.patch("/api/v1/tasks/1", json={"is_completed": True})
+    assert response.status_code == 200
+    assert response.json() == {"id": 1, "title": "Test Task", "is_completed": True}
+
+    response = client.get("/api/v1/tasks/1")
+    assert response.json()["is_completed"] is True
+
+
+def test_update_task_not_found(client: TestClient):
+    """Test updating a task that doesn't exist"""
+    response = client.patch("/api/v1/tasks/999", json={"title": "New"})
+    assert response.status_code == 404
+    assert "not found" in response.json()["detail"]
+
+
+def test_update_task_without_changes(client: TestClient, sample_task_data):
+    """Test updating a task with an empty body"""
+    client.post("/api/v1/tasks", json=sample_task_data)
+    response = client.patch("/api/v1/tasks/1", json={})
+    assert response.status_code == 422
+
+
+def test_delete_task(client: TestClient, sample_task_data):
+    """Test deleting a task"""
+    client.post("/api/v1/tasks", json=sample_task_data)
+
+    response = client.delete("/api/v1/tasks/1")
+    assert response.status_code == 204
+
+    response = client.get("/api/v1/tasks/1")
+    assert response.status_code == 404
+
+
+def test_delete_task_not_found(client: TestClient):
+    """Test deleting a task that doesn't exist"""
+    response = client.delete("/api/v1/tasks/999")
+    assert response.status_code == 404
+
+
+def test_bulk_update_by_ids(client: TestClient):
+    """Test updating a list of tasks by ID"""
+    create_tasks(client, 4)
+
+    response = client.patch(
+        "/api/v1/tasks", json={"ids": [1, 3, 999], "changes": {"title": "Renamed"}}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 2, "ids": [1, 3], "ids_truncated": False}
+
+    titles = {task["id"]: task["title"] for task in client.get("/api/v1/tasks").json()}
+    assert titles == {1: "Renamed", 2: "Task 2", 3: "Renamed", 4: "Task 4"}
+
+
+def test_bulk_update_by_filter(client: TestClient):
+    """Test updating every task matching a filter"""
+    create_tasks(client, 4)
+
+    response = client.patch(
+        "/api/v1/tasks",
+        json={"filter": {"is_completed": False}, "changes": {"is_completed": True}},
+    )
+    assert response.status_code == 200
+    assert sorted(response.json()["ids"]) == [1, 3]
+
+    tasks = client.get("/api/v1/tasks").json()
+    assert all(task["is_completed"] for task in tasks)
+
+
+def test_bulk_update_caps_returned_ids(client: TestClient, monkeypatch):
+    """Test large bulk writes report every task but list only the first IDs"""
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+    monkeypatch.setattr(settings, "bulk_max_returned_ids", 3)
+    create_tasks(client, 7)
+
+    response = client.patch(
+        "/api/v1/tasks",
+        json={"filter": {"is_completed": False}, "changes": {"title": "x"}},
+    )
+    assert response.json() == {"count": 4, "ids": [1, 3, 5], "ids_truncated": True}
+
+
+def test_bulk_update_requires_one_selector(client: TestClient):
+    """Test bulk updates need exactly one of ids or filter"""
+    changes = {"title": "Renamed"}
+    response = client.patch("/api/v1/tasks", json={"changes": changes})
+    assert response.status_code == 422
+
+    response = client.patch(
+        "/api/v1/tasks",
+        json={"ids": [1], "filter": {"is_completed": True}, "changes": changes},
+    )
+    assert response.status_code == 422
+
+    response = client.patch("/api/v1/tasks", json={"filter": {}, "changes": changes})
+    assert response.status_code == 422
+
+
+def test_bulk_delete_by_ids(client: TestClient):
+    """Test deleting a list of tasks by ID"""
+    create_tasks(client, 3)
+
+    response = client.delete("/api/v1/tasks?ids=1&ids=2")
+    assert response.status_code == 200
+    assert response.json() == {"count": 2, "ids": [1, 2], "ids_truncated": False}
+    assert [task["id"] for task in client.get("/api/v1/tasks").json()] == [3]
+
+
+def test_bulk_delete_by_filter(client: TestClient):
+    """Test deleting every completed task"""
+    create_tasks(client, 5)
+
+    response = client.delete("/api/v1/tasks?is_completed=true")
+    assert response.status_code == 200
+    assert sorted(response.json()["ids"]) == [2, 4]
+
+    remaining = client.get("/api/v1/tasks").json()
+    assert [task["id"] for task in remaining] == [1, 3, 5]
+
+
+def test_bulk_delete_requires_one_selector(client: TestClient):
+    """Test bulk deletes need exactly one of ids or is_completed"""
+    response = client.delete("/api/v1/tasks")
+    assert response.status_code == 422
+
+    response = client.delete("/api/v1/tasks?ids=1&is_completed=true")
+    assert response.status_code == 422
+
+
+def test_bulk_delete_database_error(client: TestClient):
+    """Test database errors during bulk deletes"""
+    with patch("app.api.task_router.task_crud.delete_tasks") as mock_delete:
+        mock_delete.side_effect = Exception("Database connection failed")
+        response = client.delete("/api/v1/tasks?ids=1")
+
+    assert response.status_code == 500
+    assert "Error deleting tasks" in response.json()["detail"]
+
+
+def test_failed_bulk_delete_invalidates_cached_count(client: TestClient, monkeypatch):
+    """Test a bulk delete failing part way still drops the cached count"""
+    monkeypatch.setattr(settings, "task_count_cache_ttl_s", 60.0)
+    create_tasks(client, 3)
+    task_count_cache.invalidate()
+    response = client.get("/api/v1/tasks?count=cached")
+    assert response.headers["X-Total-Count"] == "3"
+
+    def delete_then_fail(db, **kwargs):
+        task_crud.delete_task(db, 1)
+        raise Exception("Database connection failed")
+
+    with patch("app.api.task_router.task_crud.delete_tasks", delete_then_fail):
+        assert client.delete("/api/v1/tasks?ids=1&ids=2").status_code == 500
+
+    response = client.get("/api/v1/tasks?count=cached")
+    assert response.headers["X-Total-Count"] == "2"
+    task_count_cache.invalidate()
+
+
+def test_get_tasks_total_count(client: TestClient):
+    """Test task lists report the total count and how it was computed"""
+    create_tasks(client, 3)
+
+    response = client.get("/api/v1/tasks?count=exact")
+    assert response.headers["X-Total-Count"] == "3"
+    assert response.headers["X-Total-Count-Mode"] == "exact"
+
+    # SQLite has no planner estimate, so the count is exact
+    response = client.get("/api/v1/tasks?count=estimated")
+    assert response.headers["X-Total-Count"] == "3"
+    assert response.headers["X-Total-Count-Mode"] == "exact"
+
+
+def test_get_tasks_cached_count_invalidated_by_writes(client: TestClient):
+    """Test creating and deleting tasks refreshes the cached count"""
+    create_tasks(client, 2)
+    response = client.get("/api/v1/tasks?count=cached")
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.headers["X-Total-Count-Mode"] == "cached"
+
+    client.post("/api/v1/tasks", json={"id": 3, "title": "Task 3"})
+    response = client.get("/api/v1/tasks?count=cached")
+    assert response.headers["X-Total-Count"] == "3"
+
+    client.delete("/api/v1/tasks?ids=1&ids=2")
+    response = client.get("/api/v1/tasks?count=cached")
+    assert response.headers["X-Total-Count"] == "1"
+
+
+def test_get_tasks_default_count_mode(client: TestClient, monkeypatch):
+    """Test the count mode defaults to the configured one"""
+    monkeypatch.setattr(settings, "task_count_mode", "none")
+    response = client.get("/api/v1/tasks")
+    assert response.status_code == 200
+    assert "X-Total-Count" not in response.headers
+
+    response = client.get("/api/v1/tasks?count=bogus")
+    assert response.status_code == 422
@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import event, update
+
+from app.crud import task as task_crud
+from app.models.task import Task as TaskModel
+
+
+@pytest.fixture
+def tasks(db_session):
+    """Ten tasks, the even ones completed"""
+    db_session.add_all(
+        TaskModel(id=i, title=f"Task {i}", is_completed=i % 2 == 0)
+        for i in range(1, 11)
+    )
+    db_session.commit()
+    return db_session
+
+
+@pytest.fixture
+def statements(db_session):
+    """Record the UPDATE/DELETE statements sent by the session"""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("UPDATE", "DELETE")):
+            recorded.append(statement)
+
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", record)
+    yield recorded
+    event.remove(bind, "before_cursor_execute", record)
+
+
+def test_update_task_returns_row(tasks):
+    """Test single updates return the new column values"""
+    row = task_crud.update_task(tasks, 1, {"title": "Renamed"})
+    assert (row.id, row.title, row.is_completed) == (1, "Renamed", False)
+    assert task_crud.update_task(tasks, 999, {"title": "Renamed"}) is None
+
+
+def test_delete_task(tasks):
+    """Test single deletes report whether a row was removed"""
+    assert task_crud.delete_task(tasks, 1) is True
+    assert task_crud.delete_task(tasks, 1) is False
+
+
+def test_update_tasks_by_ids_in_batches(tasks, statements):
+    """Test ID lists are split into bounded statements"""
+    result = task_crud.update_tasks(
+        tasks, {"title": "Renamed"}, batch_size=2, ids=[5, 1, 3, 3, 7, 42]
+    )
+
+    assert result.ids == [1, 3, 5, 7]
+    assert len(statements) == 3
+    renamed = tasks.query(TaskModel.id).filter_by(title="Renamed").all()
+    assert sorted(task_id for (task_id,) in renamed) == [1, 3, 5, 7]
+
+
+def test_update_tasks_by_criteria_in_batches(tasks, statements):
+    """Test criteria updates terminate when rows stop matching"""
+    result = task_crud.update_tasks(
+        tasks,
+        {"is_completed": True},
+        batch_size=2,
+        criteria={"is_completed": False},
+    )
+
+    assert result.ids == [1, 3, 5, 7, 9]
+    # Two full batches, one partial batch
+    assert len(statements) == 3
+    assert tasks.query(TaskModel).filter_by(is_completed=False).count() == 0
+
+
+def test_update_tasks_by_criteria_survives_concurrent_changes(tasks):
+    """Test a batch shrunk by a concurrent change does not end the walk"""
+    bind = tasks.get_bind()
+    changed = []
+
+    def change_concurrently(conn, cursor, statement, parameters, context, many):
+        # Complete task 1 between the keyset SELECT and the first UPDATE
+        if statement.startswith("UPDATE") and not changed:
+            changed.append(statement)
+            conn.execute(
+                update(TaskModel).where(TaskModel.id == 1).values(is_completed=True)
+            )
+
+    event.listen(bind, "before_cursor_execute", change_concurrently)
+    try:
+        result = task_crud.update_tasks(
+            tasks,
+            {"title": "Renamed"},
+            batch_size=2,
+            criteria={"is_completed": False},
+        )
+    finally:
+        event.remove(bind, "before_cursor_execute", change_concurrently)
+
+    assert result.ids == [3, 5, 7, 9]
+
+
+def test_delete_tasks_by_criteria_in_batches(tasks, statements):
+    """Test criteria deletes are batched"""
+    result = task_crud.delete_tasks(
+        tasks, batch_size=5, criteria={"is_completed": True}
+    )
+
+    assert result.ids == [2, 4, 6, 8, 10]
+    # One full batch; the empty SELECT after it confirms nothing is left
+    assert len(statements) == 1
+    assert tasks.query(TaskModel).count() == 5
+
+
+def test_bulk_result_ids_are_capped(tasks):
+    """Test every change is counted but only the lowest IDs are kept"""
+    result = task_crud.update_tasks(
+        tasks,
+        {"title": "Renamed"},
+        batch_size=3,
+        criteria={"is_completed": False},
+        max_ids=2,
+    )
+    assert result == task_crud.BulkResult(count=5, ids=[1, 3])
+
+
+def test_delete_tasks_by_ids(tasks):
+    """Test deleting an ID list"""
+    result = task_crud.delete_tasks(tasks, batch_size=100, ids=[1, 2, 99])
+    assert result.ids == [1, 2]
+    assert tasks.query(TaskModel).count() == 8
@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from app.schemas.task import Task
+from app.schemas.task import Task, TaskBulkUpdate, TaskFilter, TaskUpdate
 
 
 def test_task_schema_valid_data():
@@ -77,3 +77,28 @@ def test_task_schema_json_deserialization():
     assert task.id == 1
     assert task.title == "Test Task"
     assert task.is_completed is True
+
+
+def test_task_update_changed_fields():
+    """Test TaskUpdate only reports provided fields"""
+    assert TaskUpdate(is_completed=True).changed_fields() == {"is_completed": True}
+
+    with pytest.raises(ValidationError):
+        TaskUpdate()
+
+
+def test_task_bulk_update_selector():
+    """Test TaskBulkUpdate requires exactly one selector"""
+    bulk = TaskBulkUpdate(filter={"is_completed": True}, changes={"title": "Done"})
+    assert bulk.filter.criteria() == {"is_completed": True}
+
+    with pytest.raises(ValidationError):
+        TaskBulkUpdate(changes={"title": "Done"})
+
+    with pytest.raises(ValidationError):
+        TaskBulkUpdate(
+            ids=[1], filter={"is_completed": True}, changes={"title": "Done"}
+        )
+
+    with pytest.raises(ValidationError):
+        TaskFilter()
@@ -0,0 +1,331 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app import cancellation
+from app.cancellation import (
+    CancellationMiddleware,
+    CancellationScope,
+    CancelReason,
+    ClientDisconnected,
+    DeadlineExceeded,
+    install_cancellation,
+    request_timeout_ms,
+)
+from app.config import settings
+from app.diagnostics import install_slow_query_log
+from tests.conftest import engine, override_get_db
+
+# Counts to 100 million in SQLite, far longer than any test waits
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+    "WHERE x < 100000000) SELECT count(*) FROM c"
+)
+
+
+class AsgiCall:
+    """Drive one ASGI request whose client can hang up at any time"""
+
+    def __init__(self, app, path, headers=()):
+        self.app = app
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"testserver"), *headers],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        self.messages = []
+        self._request_sent = False
+        self._disconnected = asyncio.Event()
+
+    def disconnect(self):
+        self._disconnected.set()
+
+    @property
+    def status(self):
+        return self.messages[0]["status"] if self.messages else None
+
+    async def receive(self):
+        if not self._request_sent:
+            self._request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def run(self):
+        await self.app(self.scope, self.receive, self.send)
+
+
+@pytest.fixture
+def slow_app(test_db):
+    """App running an endless query and an endless stream"""
+    install_cancellation(engine)
+    app = FastAPI()
+    app.add_middleware(CancellationMiddleware)
+    app.state.started = threading.Event()
+    app.state.chunks = itertools.count()
+
+    @app.get("/slow")
+    def slow(db: Session = Depends(override_get_db)):
+        app.state.started.set()
+        return {"count": db.execute(SLOW_QUERY).scalar()}
+
+    @app.get("/stream")
+    def stream():
+        def chunks():
+            while True:
+                next(app.state.chunks)
+                time.sleep(0.01)
+                yield "chunk\n"
+
+        return StreamingResponse(chunks())
+
+    return app
+
+
+async def wait_until(condition, timeout=2.0):
+    """Poll ``condition`` without blocking the event loop"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def test_disconnect_cancels_query_and_frees_connection(slow_app):
+    """Test a client disconnect interrupts the query and returns its connection"""
+    checked_out = engine.pool.checkedout()
+
+    async def scenario():
+        call = AsgiCall(slow_app, "/slow")
+        request = asyncio.create_task(call.run())
+        assert await asyncio.to_thread(slow_app.state.started.wait, 5)
+        await wait_until(lambda: engine.pool.checkedout() == checked_out + 1)
+        # Let SQLite start executing the statement
+        await asyncio.sleep(0.2)
+
+        call.disconnect()
+        disconnected_at = time.monotonic()
+        await wait_until(lambda: engine.pool.checkedout() == checked_out)
+        freed_after = time.monotonic() - disconnected_at
+        await asyncio.wait_for(request, 5)
+        return call, freed_after
+
+    call, freed_after = asyncio.run(scenario())
+    assert freed_after < 1.0
+    assert call.status == 499
+
+
+def test_deadline_cancels_query(slow_app):
+    """Test the request header deadline interrupts the query with a 504"""
+    with TestClient(slow_app) as client:
+        start = time.monotonic()
+        response = client.get("/slow", headers={"X-Request-Timeout": "200"})
+
+    assert response.status_code == 504
+    assert response.json()["detail"] == "Request deadline exceeded"
+    assert time.monotonic() - start < 2.0
+
+
+def test_disconnect_stops_streaming(slow_app):
+    """Test a stream stops producing chunks once the client is gone"""
+
+    async def scenario():
+        call = AsgiCall(slow_app, "/stream")
+        request = asyncio.create_task(call.run())
+        await wait_until(lambda: len(call.messages) > 3)
+        call.disconnect()
+        await asyncio.wait_for(request, 2)
+
+    asyncio.run(scenario())
+    produced = next(slow_app.state.chunks)
+    time.sleep(0.1)
+    assert next(slow_app.state.chunks) <= produced + 2
+
+
+def test_deadline_aborts_streaming(slow_app):
+    """Test a stream outliving its deadline is cut off"""
+
+    async def scenario():
+        call = AsgiCall(slow_app, "/stream", headers=[(b"x-request-timeout", b"100")])
+        await asyncio.wait_for(call.run(), 2)
+        return call
+
+    call = asyncio.run(scenario())
+    assert call.status == 200
+    assert call.messages[-1].get("more_body") is True
+
+
+def test_request_timeout_ms(monkeypatch):
+    """Test deadlines come from the header, capped, or from the settings"""
+    monkeypatch.setattr(settings, "request_timeout_ms", 1000)
+    monkeypatch.setattr(settings, "max_request_timeout_ms", 5000)
+    assert request_timeout_ms(None) == 1000
+    assert request_timeout_ms("250") == 250
+    assert request_timeout_ms("60000") == 5000
+    for value in ("0", "-5", "soon"):
+        with pytest.raises(ValueError):
+            request_timeout_ms(value)
+
+
+def test_invalid_timeout_header(client: TestClient):
+    """Test malformed deadlines are rejected"""
+    response = client.get("/api/v1/tasks", headers={"X-Request-Timeout": "soon"})
+    assert response.status_code == 400
+    assert "X-Request-Timeout" in response.json()["detail"]
+
+
+def test_scope_cancel_interrupts_attached_connections():
+    """Test cancelling interrupts attached connections only once"""
+    scope = CancellationScope()
+    postgres, sqlite = MagicMock(spec=["cancel"]), MagicMock(spec=["interrupt"])
+    scope.attach(postgres)
+    scope.attach(sqlite)
+    detached = MagicMock(spec=["cancel"])
+    scope.attach(detached)
+    scope.detach(detached)
+
+    scope.cancel(CancelReason.DISCONNECT)
+    scope.cancel(CancelReason.DEADLINE)
+
+    postgres.cancel.assert_called_once()
+    sqlite.interrupt.assert_called_once()
+    detached.cancel.assert_not_called()
+    with pytest.raises(ClientDisconnected):
+        scope.check()
+
+
+def test_scope_check_after_deadline():
+    """Test an expired deadline fails the next query"""
+    scope = CancellationScope(timeout_ms=1)
+    time.sleep(0.01)
+    with pytest.raises(DeadlineExceeded):
+        scope.check()
+    assert scope.reason is CancelReason.DEADLINE
+
+
+def test_statement_timeout_on_postgres():
+    """Test PostgreSQL transactions get the remaining time as statement_timeout"""
+    connection = MagicMock()
+    connection.dialect.name = "postgresql"
+    token = cancellation._current_scope.set(CancellationScope(timeout_ms=5000))
+    try:
+        cancellation._set_statement_timeout(None, None, connection)
+    finally:
+        cancellation._current_scope.reset(token)
+
+    statement = connection.exec_driver_sql.call_args.args[0]
+    assert statement.startswith("SET LOCAL statement_timeout = ")
+    assert 4000 < int(statement.rsplit(" ", 1)[1]) <= 5000
+
+    connection.reset_mock()
+    cancellation._set_statement_timeout(None, None, connection)
+    connection.exec_driver_sql.assert_not_called()
+
+
+def test_statement_timeout_reported_as_deadline():
+    """Test PostgreSQL statement timeouts at the deadline map to a 504"""
+    scope = CancellationScope(timeout_ms=1)
+    time.sleep(0.01)
+    context = SimpleNamespace(original_exception=SimpleNamespace(pgcode="57014"))
+    token = cancellation._current_scope.set(scope)
+    try:
+        error = cancellation._handle_error(context)
+    finally:
+        cancellation._current_scope.reset(token)
+    assert isinstance(error, DeadlineExceeded)
+
+
+def test_cancelled_query_leaves_no_slow_query_state():
+    """Test refusing a query on a cancelled request skips the cursor listeners"""
+    engine = create_engine("sqlite://")
+    install_slow_query_log(engine)
+    install_cancellation(engine)
+    scope = CancellationScope()
+    scope.cancel(CancelReason.DISCONNECT)
+
+    with engine.connect() as conn:
+        token = cancellation._current_scope.set(scope)
+        try:
+            for _ in range(3):
+                with pytest.raises(ClientDisconnected):
+                    conn.execute(text("SELECT 1"))
+        finally:
+            cancellation._current_scope.reset(token)
+        assert not conn.info.get("query_start_time")
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    engine.dispose()
+
+
+def test_export_tasks(client: TestClient, monkeypatch):
+    """Test tasks are streamed as JSON lines across pages"""
+    monkeypatch.setattr("app.api.task_router.EXPORT_PAGE_SIZE", 2)
+    for task_id in (3, 1, 2, 5, 4):
+        client.post("/api/v1/tasks", json={"id": task_id, "title": f"Task {task_id}"})
+
+    response = client.get("/api/v1/tasks/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    tasks = [json.loads(line) for line in response.text.splitlines()]
+    assert [task["id"] for task in tasks] == [1, 2, 3, 4, 5]
+
+
+def test_long_routes_lift_default_deadline(client: TestClient, monkeypatch):
+    """Test exports and bulk writes outlive the default deadline, reads do not"""
+    monkeypatch.setattr("app.api.task_router.EXPORT_PAGE_SIZE", 1)
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+    for task_id in range(1, 6):
+        client.post("/api/v1/tasks", json={"id": task_id, "title": f"Task {task_id}"})
+
+    def slow_statement(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(0.06)
+
+    install_cancellation(engine)
+    monkeypatch.setattr(settings, "request_timeout_ms", 50)
+    event.listen(engine, "before_cursor_execute", slow_statement)
+    try:
+        response = client.get("/api/v1/tasks?count=exact")
+        assert response.status_code == 504
+
+        response = client.get("/api/v1/tasks/export")
+        exported = [json.loads(line)["id"] for line in response.text.splitlines()]
+        assert exported == [1, 2, 3, 4, 5]
+
+        response = client.patch(
+            "/api/v1/tasks",
+            json={"filter": {"is_completed": False}, "changes": {"title": "x"}},
+        )
+        assert response.json()["count"] == 5
+
+        # A deadline the client asked for still applies
+        response = client.delete(
+            "/api/v1/tasks?is_completed=false", headers={"X-Request-Timeout": "50"}
+        )
+        assert response.status_code == 504
+
+        response = client.delete("/api/v1/tasks?is_completed=false")
+        assert response.status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", slow_statement)
+    assert client.get("/api/v1/tasks").json() == []
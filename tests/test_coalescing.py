@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.cancellation import ClientDisconnected, RequestCancelled
+from app.coalescing import SingleFlight, coalesce, task_reads
+from app.config import settings
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll ``condition`` until it holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, key, fn, callers, **kwargs):
+    """Start ``callers`` calls and return once the leader is in flight"""
+    kwargs.setdefault("max_waiters", 100)
+    kwargs.setdefault("timeout", 5.0)
+    executor = ThreadPoolExecutor(max_workers=callers)
+    futures = [executor.submit(flight.do, key, fn, **kwargs) for _ in range(callers)]
+    return executor, futures
+
+
+def test_concurrent_calls_share_one_execution():
+    """Test callers with the same key share a single execution"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["result"]
+
+    executor, futures = run_concurrently(flight, "key", fn, callers=10)
+    started.wait(5)
+    # Let the followers reach the waiting state before releasing the leader
+    wait_for(lambda: flight._calls["key"].waiters == 9)
+    release.set()
+
+    results = [future.result() for future in futures]
+    executor.shutdown()
+    assert len(calls) == 1
+    assert all(result == ["result"] for result in results)
+    assert flight.stats.executed == 1
+    assert flight.stats.shared == 9
+
+
+def test_different_keys_run_independently():
+    """Test calls with different keys are not coalesced"""
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1, max_waiters=10, timeout=1) == 1
+    assert flight.do("b", lambda: 2, max_waiters=10, timeout=1) == 2
+    assert flight.stats.executed == 2
+
+
+def test_completed_calls_are_not_cached():
+    """Test a finished call does not serve later callers"""
+    flight = SingleFlight()
+    results = iter([1, 2])
+    assert flight.do("key", lambda: next(results), max_waiters=10, timeout=1) == 1
+    assert flight.do("key", lambda: next(results), max_waiters=10, timeout=1) == 2
+
+
+def test_errors_are_shared_with_waiters():
+    """Test waiters receive the leader's exception"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    executor, futures = run_concurrently(flight, "key", fn, callers=3)
+    started.wait(5)
+    wait_for(lambda: flight._calls["key"].waiters == 2)
+    release.set()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="boom"):
+            future.result()
+    executor.shutdown()
+    assert "key" not in flight._calls
+
+
+def test_unshared_errors_fall_back_to_own_call():
+    """Test waiters run the function themselves when the leader was cancelled"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def cancelled():
+        started.set()
+        release.wait(5)
+        raise ClientDisconnected()
+
+    executor, futures = run_concurrently(
+        flight, "key", cancelled, callers=1, unshared=(RequestCancelled,)
+    )
+    started.wait(5)
+    waiters = ThreadPoolExecutor(max_workers=1)
+    waiter = waiters.submit(
+        flight.do,
+        "key",
+        lambda: "own",
+        max_waiters=10,
+        timeout=5,
+        unshared=(RequestCancelled,),
+    )
+    wait_for(lambda: flight._calls["key"].waiters == 1)
+    release.set()
+
+    assert waiter.result() == "own"
+    with pytest.raises(ClientDisconnected):
+        futures[0].result()
+    executor.shutdown()
+    waiters.shutdown()
+    assert flight.stats.fallbacks == 1
+
+
+def test_waiter_limit_falls_back_to_own_call():
+    """Test callers above the waiter limit run the function themselves"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    executor, futures = run_concurrently(flight, "key", fn, callers=1, max_waiters=0)
+    started.wait(5)
+    # The leader is in flight and no waiters are allowed
+    fallback = threading.Thread(
+        target=flight.do, args=("key", fn), kwargs={"max_waiters": 0, "timeout": 5}
+    )
+    fallback.start()
+    wait_for(lambda: len(calls) == 2)
+    release.set()
+    fallback.join()
+    futures[0].result()
+    executor.shutdown()
+
+    assert flight.stats.executed == 2
+    assert flight.stats.fallbacks == 1
+
+
+def test_timeout_falls_back_to_own_call():
+    """Test waiters run the function themselves after the timeout"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    executor, futures = run_concurrently(flight, "key", slow, callers=1)
+    started.wait(5)
+    result = flight.do("key", lambda: "fast", max_waiters=10, timeout=0.01)
+    release.set()
+    futures[0].result()
+    executor.shutdown()
+
+    assert result == "fast"
+    assert flight.stats.fallbacks == 1
+
+
+def test_coalesce_disabled(monkeypatch):
+    """Test coalescing can be switched off"""
+    monkeypatch.setattr(settings, "coalesce_reads", False)
+    executed = task_reads.stats.executed
+    assert coalesce("key", lambda: 42) == 42
+    assert task_reads.stats.executed == executed
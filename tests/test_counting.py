@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app import counting
+from app.config import TASK_COUNT_MODES, Settings, settings
+from app.counting import CountMode, count_tasks, task_count_cache
+from app.models.task import Task as TaskModel
+from app.sharding import SingleDatabase
+
+
+@pytest.fixture
+def tasks(db_session):
+    """Three tasks and an empty count cache"""
+    task_count_cache.invalidate()
+    db_session.add_all(TaskModel(id=i, title=f"Task {i}") for i in range(1, 4))
+    db_session.commit()
+    yield db_session
+    task_count_cache.invalidate()
+
+
+def postgres_session(estimate):
+    """Mock session on PostgreSQL returning ``estimate`` from the catalog"""
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    db.execute.return_value.scalar.return_value = estimate
+    db.execute.return_value.scalar_one.return_value = 42
+    return db
+
+
+def test_count_exact(tasks):
+    """Test exact counts"""
+    assert count_tasks(SingleDatabase(tasks), CountMode.EXACT) == (3, CountMode.EXACT)
+
+
+def test_count_estimated_falls_back_on_sqlite(tasks):
+    """Test estimated counts fall back to exact outside PostgreSQL"""
+    assert count_tasks(SingleDatabase(tasks), CountMode.ESTIMATED) == (
+        3,
+        CountMode.EXACT,
+    )
+
+
+def test_count_estimated_on_postgres():
+    """Test estimated counts come from the planner statistics"""
+    db = postgres_session(estimate=1_000_000)
+    assert count_tasks(SingleDatabase(db), CountMode.ESTIMATED) == (
+        1_000_000,
+        CountMode.ESTIMATED,
+    )
+    statement = str(db.execute.call_args.args[0])
+    assert "pg_class" in statement
+    assert "reltuples" in statement
+
+
+def test_count_estimated_never_analyzed():
+    """Test tables without statistics are counted exactly"""
+    db = postgres_session(estimate=None)
+    assert count_tasks(SingleDatabase(db), CountMode.ESTIMATED) == (42, CountMode.EXACT)
+
+
+def test_count_cached(tasks, monkeypatch):
+    """Test cached counts are reused until they expire or are invalidated"""
+    monkeypatch.setattr(settings, "task_count_cache_ttl_s", 60.0)
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (3, CountMode.CACHED)
+
+    tasks.add(TaskModel(id=4, title="Task 4"))
+    tasks.commit()
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (3, CountMode.CACHED)
+
+    task_count_cache.invalidate()
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (4, CountMode.CACHED)
+
+
+def test_count_cached_skips_counts_racing_a_write(tasks, monkeypatch):
+    """Test a count overtaken by an invalidation is returned but not cached"""
+    monkeypatch.setattr(settings, "task_count_cache_ttl_s", 60.0)
+    exact = counting._exact
+
+    def write_while_counting(db):
+        total = exact(db)
+        tasks.add(TaskModel(id=4, title="Task 4"))
+        tasks.commit()
+        task_count_cache.invalidate()
+        return total
+
+    monkeypatch.setattr(counting, "_exact", write_while_counting)
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (3, CountMode.CACHED)
+    assert task_count_cache.get() is None
+
+    monkeypatch.setattr(counting, "_exact", exact)
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (4, CountMode.CACHED)
+
+
+def test_count_cached_expires(tasks, monkeypatch):
+    """Test cached counts expire after the TTL"""
+    monkeypatch.setattr(settings, "task_count_cache_ttl_s", 0.0)
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (3, CountMode.CACHED)
+
+    tasks.add(TaskModel(id=4, title="Task 4"))
+    tasks.commit()
+    assert count_tasks(SingleDatabase(tasks), CountMode.CACHED) == (4, CountMode.CACHED)
+
+
+def test_task_count_mode_validated_on_load(monkeypatch):
+    """Test a mistyped TASK_COUNT_MODE fails when settings load"""
+    assert set(TASK_COUNT_MODES) == {mode.value for mode in CountMode}
+    monkeypatch.setenv("TASK_COUNT_MODE", "estimate")
+    with pytest.raises(ValueError, match="TASK_COUNT_MODE"):
+        Settings()
+    monkeypatch.setenv("TASK_COUNT_MODE", "cached")
+    assert Settings().task_count_mode == "cached"
@@ -0,0 +1,188 @@
+import marshal
+import pstats
+from dataclasses import dataclass
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.config import settings
+from app.diagnostics import (
+    ExplainThrottle,
+    ProfileRecord,
+    RingBuffer,
+    explain_throttle,
+    install_slow_query_log,
+    is_admin_token,
+    profiled,
+    slow_queries,
+)
+
+
+@dataclass
+class Record:
+    value: int
+    id: int = 0
+
+
+@pytest.fixture
+def slow_query_engine(monkeypatch):
+    """In-memory engine logging every statement as slow"""
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 0.0)
+    engine = create_engine("sqlite://")
+    install_slow_query_log(engine)
+    slow_queries.clear()
+    explain_throttle.clear()
+    yield engine
+    slow_queries.clear()
+    explain_throttle.clear()
+    engine.dispose()
+
+
+def test_ring_buffer_is_bounded():
+    """Test ring buffer evicts the oldest records"""
+    buffer = RingBuffer(maxlen=2)
+    for value in range(3):
+        buffer.append(Record(value=value))
+
+    records = buffer.items()
+    assert [record.value for record in records] == [2, 1]
+    assert [record.id for record in records] == [3, 2]
+    assert buffer.get(1) is None
+    assert buffer.get(3).value == 2
+
+    buffer.clear()
+    assert buffer.items() == []
+
+
+def test_is_admin_token(monkeypatch):
+    """Test admin token comparison"""
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert is_admin_token("anything") is False
+
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    assert is_admin_token("secret") is True
+    assert is_admin_token("wrong") is False
+    assert is_admin_token(None) is False
+
+
+def test_profiled_without_active_profile():
+    """Test wrapped endpoints behave normally when not profiled"""
+
+    def endpoint(value: int):
+        return value * 2
+
+    wrapped = profiled(endpoint)
+    assert wrapped(value=21) == 42
+    assert wrapped.__name__ == "endpoint"
+
+
+def test_profile_record_render_and_dump():
+    """Test profile records render as text and dump as pstats data"""
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.runcall(sorted, [3, 1, 2])
+    profile.create_stats()
+    record = ProfileRecord(
+        method="GET", path="/", status_code=200, duration_ms=1.0, stats=profile.stats
+    )
+
+    assert "function calls" in record.render()
+    # Rendering must not consume the stored stats
+    assert "function calls" in record.render(sort="tottime")
+    assert marshal.loads(record.dump()) == profile.stats
+
+
+def test_slow_query_log_records_plan(slow_query_engine):
+    """Test slow statements are logged with their query plan"""
+    with slow_query_engine.connect() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("SELECT id FROM items WHERE id = :id"), {"id": 1})
+
+    records = slow_queries.items()
+    assert len(records) == 2
+    select, create = records
+    assert select.statement.startswith("SELECT")
+    assert "1" in select.parameters
+    assert select.plan is not None
+    assert "items" in select.plan
+    # Only SELECT statements are explained
+    assert create.plan is None
+
+
+def test_slow_query_log_threshold(slow_query_engine, monkeypatch):
+    """Test statements under the threshold are not logged"""
+    monkeypatch.setattr(settings, "slow_query_threshold_ms", 60_000.0)
+    with slow_query_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert slow_queries.items() == []
+
+
+def test_slow_query_log_explain_disabled(slow_query_engine, monkeypatch):
+    """Test EXPLAIN capture can be switched off"""
+    monkeypatch.setattr(settings, "slow_query_explain", False)
+    with slow_query_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    (record,) = slow_queries.items()
+    assert record.plan is None
+    assert record.explain_error is None
+
+
+def test_slow_query_log_explain_throttled(slow_query_engine, monkeypatch):
+    """Test a statement is explained once per interval"""
+    monkeypatch.setattr(settings, "slow_query_explain_interval_s", 60.0)
+    with slow_query_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+
+    third, second, first = slow_queries.items()
+    assert first.plan is not None
+    assert second.plan is None
+    assert third.plan is not None
+
+
+def test_explain_throttle_is_bounded(monkeypatch):
+    """Test the throttle forgets statements instead of growing forever"""
+    monkeypatch.setattr("app.diagnostics.MAX_THROTTLED_STATEMENTS", 3)
+    throttle = ExplainThrottle()
+    for index in range(10):
+        assert throttle.allow(f"SELECT {index}", interval_s=60.0)
+    assert len(throttle._last_explained) <= 3
+    assert throttle.allow("SELECT 9", interval_s=0.0)
+
+
+def test_slow_query_log_failed_statement(slow_query_engine):
+    """Test failing statements do not leave timing state behind"""
+    with slow_query_engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info["query_start_time"] == []
+
+
+def test_install_slow_query_log_is_idempotent(slow_query_engine):
+    """Test installing the listeners twice logs each statement once"""
+    install_slow_query_log(slow_query_engine)
+    with slow_query_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert len(slow_queries.items()) == 1
+
+
+def test_profile_stats_loadable(tmp_path):
+    """Test dumped profiles load with pstats"""
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.runcall(sum, [1, 2, 3])
+    profile.create_stats()
+    record = ProfileRecord(
+        method="GET", path="/", status_code=200, duration_ms=1.0, stats=profile.stats
+    )
+    path = tmp_path / "profile.prof"
+    path.write_bytes(record.dump())
+
+    stats = pstats.Stats(str(path))
+    assert stats.total_calls > 0
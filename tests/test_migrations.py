@@ -0,0 +1,192 @@
+import io
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from alembic import command
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from app.config import settings
+from app.migrations import (
+    batched_backfill,
+    create_index_concurrently,
+    drop_index_concurrently,
+    is_lock_timeout,
+    run_with_lock_retry,
+    set_timeouts,
+)
+
+
+class PgError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+def lock_error(orig=None):
+    return OperationalError("UPDATE tasks", {}, orig or Exception("database is locked"))
+
+
+@pytest.fixture
+def connection(tmp_path):
+    """Connection to a file database with 25 tasks"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    with engine.connect() as conn:
+        conn.execute(
+            text("CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR, n INT)")
+        )
+        conn.execute(
+            text("INSERT INTO tasks (id, title, n) VALUES (:id, :title, 0)"),
+            [{"id": i, "title": f"Task {i}"} for i in range(1, 26)],
+        )
+        conn.commit()
+        yield conn
+    engine.dispose()
+
+
+def test_is_lock_timeout():
+    """Test lock and statement timeouts are recognised"""
+    assert is_lock_timeout(lock_error())
+    assert is_lock_timeout(lock_error(PgError("55P03")))
+    assert is_lock_timeout(lock_error(PgError("57014")))
+    assert not is_lock_timeout(lock_error(PgError("23505")))
+
+
+def test_run_with_lock_retry_recovers():
+    """Test lock timeouts are retried"""
+    attempts = []
+
+    def step():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise lock_error()
+        return "done"
+
+    assert run_with_lock_retry(step, retries=3, delay_s=0) == "done"
+    assert len(attempts) == 3
+
+
+def test_run_with_lock_retry_gives_up():
+    """Test retries stop after the last attempt"""
+
+    def step():
+        raise lock_error()
+
+    with pytest.raises(OperationalError):
+        run_with_lock_retry(step, retries=2, delay_s=0)
+
+
+def test_run_with_lock_retry_other_errors():
+    """Test errors other than lock timeouts are not retried"""
+    attempts = []
+
+    def step():
+        attempts.append(1)
+        raise lock_error(PgError("23505"))
+
+    with pytest.raises(OperationalError):
+        run_with_lock_retry(step, retries=5, delay_s=0)
+    assert len(attempts) == 1
+
+
+def test_set_timeouts_ignores_other_databases(connection):
+    """Test timeouts are only set on PostgreSQL"""
+    set_timeouts(connection, lock_timeout_ms=100)
+    assert connection.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_batched_backfill(connection):
+    """Test a backfill updates every matching row in batches"""
+    batches = []
+    rows = batched_backfill(
+        connection,
+        job="double",
+        table_name="tasks",
+        set_clause="n = id * 2",
+        where_clause="id % 5 != 0",
+        batch_size=10,
+        on_batch=lambda last_key, done: batches.append((last_key, done)),
+    )
+
+    assert rows == 20
+    assert batches == [(10, 8), (20, 16), (25, 20)]
+    values = dict(connection.execute(text("SELECT id, n FROM tasks")).all())
+    assert values[3] == 6
+    assert values[5] == 0
+
+
+def test_batched_backfill_resumes(connection):
+    """Test an interrupted backfill resumes after the last committed batch"""
+
+    def crash_after_two_batches(last_key, rows_done):
+        if last_key == 20:
+            raise RuntimeError("worker killed")
+
+    with pytest.raises(RuntimeError):
+        batched_backfill(
+            connection,
+            job="increment",
+            table_name="tasks",
+            set_clause="n = n + 1",
+            batch_size=10,
+            on_batch=crash_after_two_batches,
+        )
+
+    rows = batched_backfill(
+        connection,
+        job="increment",
+        table_name="tasks",
+        set_clause="n = n + 1",
+        batch_size=10,
+    )
+
+    assert rows == 25
+    # Every row was updated exactly once across both runs
+    counts = connection.execute(text("SELECT DISTINCT n FROM tasks")).scalars().all()
+    assert counts == [1]
+
+    # A completed job is not run again
+    assert batched_backfill(connection, "increment", "tasks", "n = n + 1") == 25
+    assert connection.execute(text("SELECT MAX(n) FROM tasks")).scalar() == 1
+
+
+def test_create_and_drop_index(connection):
+    """Test index helpers fall back to plain DDL outside PostgreSQL"""
+    context = MigrationContext.configure(connection)
+    with Operations.context(context):
+        create_index_concurrently("ix_tasks_n", "tasks", ["n"])
+        # Creating it again is a no-op, so the step can be retried
+        create_index_concurrently("ix_tasks_n", "tasks", ["n"])
+        indexes = [index["name"] for index in inspect(connection).get_indexes("tasks")]
+        assert "ix_tasks_n" in indexes
+
+        drop_index_concurrently("ix_tasks_n", "tasks")
+        indexes = [index["name"] for index in inspect(connection).get_indexes("tasks")]
+        assert "ix_tasks_n" not in indexes
+
+
+def test_offline_sql_for_postgres(monkeypatch):
+    """Test ``alembic upgrade --sql`` renders the concurrent index build"""
+    url = "postgresql://postgres:postgres@db:5432/taskdb"
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setattr(settings, "database_url", url)
+    output = io.StringIO()
+    # No config file, so env.py leaves the logging configuration alone
+    config = Config(output_buffer=output)
+    root = Path(__file__).resolve().parent.parent
+    config.set_main_option("script_location", str(root / "alembic"))
+
+    command.upgrade(config, "0001:0002", sql=True)
+
+    sql = output.getvalue()
+    drop = sql.index('DROP INDEX CONCURRENTLY IF EXISTS "ix_tasks_is_completed_id"')
+    create = sql.index(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_is_completed_id "
+        "ON tasks (is_completed, id)"
+    )
+    # Both run outside the migration transaction
+    assert sql.rindex("COMMIT;", 0, drop) < drop < create
+    assert sql.index("BEGIN;", create) > create
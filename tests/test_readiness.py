@@ -0,0 +1,146 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.task_router import _load_task, _read_page
+from app.config import settings
+from app.counting import CountMode, count_tasks
+from app.readiness import ReadinessMonitor, probe_database, readiness, warm_up
+from app.sharding import SingleDatabase
+from tests.conftest import engine, override_get_db
+
+
+def broken_get_db():
+    """Dependency failing like an unreachable database"""
+    raise ConnectionError("database unreachable")
+    yield
+
+
+def wait_until_ready(client: TestClient, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    return response
+
+
+@pytest.fixture(autouse=True)
+def reset_readiness():
+    readiness.reset()
+    yield
+    readiness.reset()
+
+
+def test_warm_up(test_db):
+    """Test warm-up fills the pool and builds the OpenAPI schema"""
+    app = FastAPI()
+    engine.dispose()
+
+    warm_up(app, override_get_db)
+
+    assert readiness.warmed is True
+    assert app.openapi_schema is not None
+    assert engine.pool.checkedin() == engine.pool.size()
+
+
+def test_warm_up_compiles_endpoint_queries(test_db):
+    """Test requests after warm-up reuse the statements it compiled"""
+    engine._compiled_cache.clear()
+    warm_up(FastAPI(), override_get_db)
+    compiled = len(engine._compiled_cache)
+
+    for db in override_get_db():
+        database = SingleDatabase(db)
+        for after_id, limit in [(None, None), (5, 10), (5, None), (None, 10)]:
+            _read_page(db, after_id, limit)
+        _load_task(database, 3)
+        count_tasks(database, CountMode(settings.task_count_mode))
+
+    assert len(engine._compiled_cache) == compiled
+
+
+def test_probe_database(test_db):
+    """Test probes record database health"""
+    probe_database(override_get_db)
+    ready, details = readiness.status(interval_s=5.0)
+    assert details["database"] == "healthy"
+    # Not ready until warm-up finished
+    assert ready is False
+
+    probe_database(broken_get_db)
+    _, details = readiness.status(interval_s=5.0)
+    assert details["database"] == "unhealthy"
+    assert "unreachable" in details["error"]
+
+
+def test_stale_probe_is_not_ready(test_db):
+    """Test an old probe result does not count as healthy"""
+    readiness.mark_warmed()
+    probe_database(override_get_db)
+    assert readiness.status(interval_s=5.0)[0] is True
+
+    readiness.last_probe_at -= 60
+    ready, details = readiness.status(interval_s=5.0)
+    assert ready is False
+    assert details["database"] == "unhealthy"
+
+
+def test_monitor_retries_failed_warm_up(test_db):
+    """Test warm-up is retried until the database is reachable"""
+    attempts = []
+
+    def flaky_get_db():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("database unreachable")
+        yield from override_get_db()
+
+    monitor = ReadinessMonitor(FastAPI(), [flaky_get_db], interval_s=0.01)
+    monitor.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not readiness.status(interval_s=0.01)[0]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        monitor.stop()
+    assert len(attempts) >= 3
+
+
+def test_monitor_without_warm_up():
+    """Test the worker counts as warm when warm-up is disabled"""
+    with patch("app.readiness.warm_up") as mock_warm_up:
+        monitor = ReadinessMonitor(
+            FastAPI(), [broken_get_db], interval_s=60, warm_up_enabled=False
+        )
+        monitor.start()
+        monitor.stop()
+    assert readiness.warmed is True
+    mock_warm_up.assert_not_called()
+
+
+def test_ready_endpoint(client: TestClient):
+    """Test /ready turns ready after the lifespan warm-up"""
+    response = wait_until_ready(client)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["warmed"] is True
+    assert data["database"] == "healthy"
+
+
+def test_ready_endpoint_unavailable(client: TestClient):
+    """Test /ready returns 503 while the database is unhealthy"""
+    wait_until_ready(client)
+    readiness.record_probe(False, "connection refused")
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not ready"
+    # Liveness is unaffected
+    assert client.get("/health").status_code == 200
@@ -0,0 +1,302 @@
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app import sharding
+from app.config import settings
+from app.dependencies import get_database
+from app.main import app
+from app.models.task import Base
+from app.models.task import Task as TaskModel
+from app.sharding import (
+    HashRing,
+    ShardedDatabase,
+    main,
+    merge_by_id,
+    parse_shard_urls,
+    rebalance,
+)
+
+
+def shard_urls(tmp_path, names):
+    """Named SQLite shard URLs, one file per shard"""
+    return [f"{name}=sqlite:///{tmp_path / name}.db" for name in names]
+
+
+def open_shards(tmp_path, names):
+    """Sharded database over SQLite files with the tasks table created"""
+    database = ShardedDatabase.from_urls(shard_urls(tmp_path, names), 64)
+    for engine in database.engines.values():
+        Base.metadata.create_all(bind=engine)
+    return database
+
+
+def shard_ids(database, name):
+    """IDs of the tasks stored on one shard"""
+    with database.shard_session(name) as db:
+        return list(db.scalars(select(TaskModel.id).order_by(TaskModel.id)))
+
+
+def add_tasks(database, name, ids):
+    """Store tasks directly on a shard, whether or not it owns them"""
+    with database.shard_session(name) as db:
+        db.add_all(TaskModel(id=task_id, title=f"Task {task_id}") for task_id in ids)
+        db.commit()
+
+
+@pytest.fixture
+def shards(tmp_path):
+    database = open_shards(tmp_path, ["a", "b", "c"])
+    yield database
+    database.dispose()
+
+
+@pytest.fixture
+def sharded_client(client, shards):
+    """Test client storing tasks on three SQLite shards"""
+    app.dependency_overrides[get_database] = lambda: shards
+    yield client
+
+
+def test_parse_shard_urls():
+    """Test shard names are parsed or derived from the position"""
+    assert parse_shard_urls(
+        ["east=postgresql://db1/tasks", "sqlite:///./b.db?mode=ro"]
+    ) == {"east": "postgresql://db1/tasks", "shard1": "sqlite:///./b.db?mode=ro"}
+    with pytest.raises(ValueError):
+        parse_shard_urls(["a=sqlite:///a.db", "a=sqlite:///b.db"])
+
+
+def test_hash_ring_balances_and_moves_little():
+    """Test IDs spread evenly and adding a shard only moves IDs onto it"""
+    ring = HashRing(["a", "b", "c"], virtual_nodes=64)
+    before = {task_id: ring.shard_for(task_id) for task_id in range(3000)}
+    assert all(count > 600 for count in Counter(before.values()).values())
+
+    grown = HashRing(["a", "b", "c", "d"], virtual_nodes=64)
+    moved = {
+        task_id for task_id, name in before.items() if grown.shard_for(task_id) != name
+    }
+    assert all(grown.shard_for(task_id) == "d" for task_id in moved)
+    assert 400 < len(moved) < 1200
+
+
+def test_merge_by_id():
+    """Test shard pages merge in ID order without duplicates"""
+    pages = [
+        [SimpleNamespace(id=1), SimpleNamespace(id=4)],
+        [SimpleNamespace(id=2), SimpleNamespace(id=4), SimpleNamespace(id=5)],
+    ]
+    assert [task.id for task in merge_by_id(pages)] == [1, 2, 4, 5]
+    assert [task.id for task in merge_by_id(pages, limit=2)] == [1, 2]
+
+
+def test_tasks_are_stored_on_their_shard(sharded_client, shards):
+    """Test writes and single reads are routed by task ID"""
+    for task_id in range(1, 31):
+        response = sharded_client.post(
+            "/api/v1/tasks", json={"id": task_id, "title": f"Task {task_id}"}
+        )
+        assert response.status_code == 200
+
+    for name in shards.engines:
+        ids = shard_ids(shards, name)
+        assert ids
+        assert all(shards.shard_for(task_id) == name for task_id in ids)
+
+    assert sharded_client.get("/api/v1/tasks/17").json()["title"] == "Task 17"
+    response = sharded_client.post("/api/v1/tasks", json={"id": 17, "title": "x"})
+    assert response.status_code == 409
+
+
+def test_scatter_gather_listing_and_pagination(sharded_client, shards):
+    """Test listings merge all shards and keyset pages walk every task"""
+    for task_id in range(1, 24):
+        sharded_client.post(
+            "/api/v1/tasks", json={"id": task_id, "title": f"Task {task_id}"}
+        )
+
+    response = sharded_client.get("/api/v1/tasks?count=exact")
+    assert [task["id"] for task in response.json()] == list(range(1, 24))
+    assert response.headers["X-Total-Count"] == "23"
+    assert "X-Next-After-Id" not in response.headers
+
+    seen, after_id = [], None
+    while True:
+        params = {"limit": 5}
+        if after_id is not None:
+            params["after_id"] = after_id
+        response = sharded_client.get("/api/v1/tasks", params=params)
+        page = [task["id"] for task in response.json()]
+        assert len(page) <= 5
+        seen.extend(page)
+        after_id = response.headers.get("X-Next-After-Id")
+        if after_id is None:
+            break
+    assert seen == list(range(1, 24))
+
+
+def test_sharded_bulk_updates_and_deletes(sharded_client, shards, monkeypatch):
+    """Test set-based writes reach every shard owning affected tasks"""
+    for task_id in range(1, 13):
+        sharded_client.post(
+            "/api/v1/tasks", json={"id": task_id, "title": f"Task {task_id}"}
+        )
+
+    response = sharded_client.patch(
+        "/api/v1/tasks", json={"ids": [2, 5, 9, 11], "changes": {"is_completed": True}}
+    )
+    assert response.json() == {"count": 4, "ids": [2, 5, 9, 11], "ids_truncated": False}
+
+    monkeypatch.setattr(settings, "bulk_max_returned_ids", 3)
+    response = sharded_client.delete("/api/v1/tasks?is_completed=true")
+    assert response.json() == {"count": 4, "ids": [2, 5, 9], "ids_truncated": True}
+
+    response = sharded_client.patch("/api/v1/tasks/3", json={"title": "Renamed"})
+    assert response.json()["title"] == "Renamed"
+    assert sharded_client.delete("/api/v1/tasks/3").status_code == 204
+    assert sharded_client.get("/api/v1/tasks/3").status_code == 404
+    assert len(sharded_client.get("/api/v1/tasks").json()) == 7
+
+
+def test_rebalancing_finds_tasks_on_previous_shard(sharded_client, shards):
+    """Test tasks not yet moved to their owner are found while rebalancing"""
+    owner = shards.shard_for(7)
+    previous = next(name for name in shards.engines if name != owner)
+    add_tasks(shards, previous, [7, 8])
+    assert sharded_client.get("/api/v1/tasks/7").status_code == 404
+
+    shards.rebalancing = True
+    assert sharded_client.get("/api/v1/tasks/7").json()["title"] == "Task 7"
+    response = sharded_client.post("/api/v1/tasks", json={"id": 7, "title": "x"})
+    assert response.status_code == 409
+    response = sharded_client.patch("/api/v1/tasks/7", json={"title": "Renamed"})
+    assert response.json()["title"] == "Renamed"
+
+    response = sharded_client.patch(
+        "/api/v1/tasks", json={"ids": [7, 8], "changes": {"is_completed": True}}
+    )
+    assert response.json()["ids"] == [7, 8]
+
+    assert sharded_client.delete("/api/v1/tasks/7").status_code == 204
+    assert sharded_client.get("/api/v1/tasks/7").status_code == 404
+    assert shard_ids(shards, previous) == [8]
+
+
+def test_writes_during_rebalance_are_not_lost(sharded_client, shards, monkeypatch):
+    """Test writes landing while a rebalance batch is in flight survive the move"""
+    owner = shards.shard_for(7)
+    previous = next(name for name in shards.engines if name != owner)
+    add_tasks(shards, previous, [7, 8])
+    shards.rebalancing = True
+    move = sharding._move
+
+    def write_then_move(database, source, target, ids):
+        # After the rebalancer read the batch, before it moves it
+        sharded_client.patch("/api/v1/tasks/7", json={"title": "Renamed"})
+        sharded_client.delete("/api/v1/tasks/8")
+        return move(database, source, target, ids)
+
+    monkeypatch.setattr(sharding, "_move", write_then_move)
+    assert rebalance(shards) == {f"{previous}->{owner}": 1}
+
+    assert shard_ids(shards, owner) == [7]
+    assert shard_ids(shards, previous) == []
+    assert sharded_client.get("/api/v1/tasks/7").json()["title"] == "Renamed"
+    assert sharded_client.get("/api/v1/tasks/8").status_code == 404
+
+
+def test_bulk_write_counts_duplicates_once(sharded_client, shards):
+    """Test a task on two shards while rebalancing is counted once"""
+    owner = shards.shard_for(7)
+    previous = next(name for name in shards.engines if name != owner)
+    add_tasks(shards, owner, [7])
+    add_tasks(shards, previous, [7])
+    shards.rebalancing = True
+
+    response = sharded_client.patch(
+        "/api/v1/tasks", json={"ids": [7], "changes": {"is_completed": True}}
+    )
+    assert response.json() == {"count": 1, "ids": [7], "ids_truncated": False}
+
+
+def test_shards_are_disposed_on_shutdown(shards, monkeypatch):
+    """Test the app closes shard connections on shutdown and can restart"""
+    monkeypatch.setattr("app.main.shards", shards)
+    with patch.object(shards, "dispose", wraps=shards.dispose) as dispose:
+        with TestClient(app):
+            pass
+    dispose.assert_called_once()
+    # Fan-out threads are started again on demand
+    assert shards.scatter(lambda db: "ok") == ["ok", "ok", "ok"]
+
+
+def test_rebalance_after_adding_shard(tmp_path):
+    """Test rebalancing moves tasks to their new owner and is idempotent"""
+    old = open_shards(tmp_path, ["a", "b"])
+    for task_id in range(1, 201):
+        add_tasks(old, old.shard_for(task_id), [task_id])
+    old.dispose()
+
+    database = open_shards(tmp_path, ["a", "b", "c"])
+    try:
+        planned = rebalance(database, batch_size=16, dry_run=True)
+        assert set(planned) == {"a->c", "b->c"}
+        assert shard_ids(database, "c") == []
+
+        moved = rebalance(database, batch_size=16)
+        assert moved == planned
+        ids = []
+        for name in database.engines:
+            shard = shard_ids(database, name)
+            assert all(database.shard_for(task_id) == name for task_id in shard)
+            ids.extend(shard)
+        assert sorted(ids) == list(range(1, 201))
+
+        assert rebalance(database, batch_size=16) == {}
+    finally:
+        database.dispose()
+
+
+def test_rebalance_removes_leftover_copies(tmp_path):
+    """Test a copy left by an interrupted move is dropped, not duplicated"""
+    database = open_shards(tmp_path, ["a", "b"])
+    try:
+        owner = database.shard_for(7)
+        other = "b" if owner == "a" else "a"
+        add_tasks(database, owner, [7])
+        add_tasks(database, other, [7])
+
+        assert rebalance(database) == {f"{other}->{owner}": 1}
+        assert shard_ids(database, owner) == [7]
+        assert shard_ids(database, other) == []
+    finally:
+        database.dispose()
+
+
+def test_rebalance_command(tmp_path, monkeypatch, capsys):
+    """Test the rebalance command reports moved tasks"""
+    database = open_shards(tmp_path, ["a", "b"])
+    add_tasks(database, "a", range(1, 21))
+    database.dispose()
+
+    monkeypatch.setattr(settings, "shard_urls", shard_urls(tmp_path, ["a", "b"]))
+    main(["rebalance", "--dry-run"])
+    assert "Would move" in capsys.readouterr().out
+
+    main(["rebalance"])
+    assert "in total" in capsys.readouterr().out
+
+    database = open_shards(tmp_path, ["a", "b"])
+    with database.shard_session("b") as db:
+        on_b = db.execute(select(func.count()).select_from(TaskModel)).scalar_one()
+    database.dispose()
+    assert on_b > 0
+
+    monkeypatch.setattr(settings, "shard_urls", [])
+    with pytest.raises(SystemExit):
+        main(["rebalance"])